@@ -1,60 +1,176 @@
 from crewai import Agent, Task, Crew, Process
-from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
-from tools import SummarizationTool, WebExtractor, ExtractContentFromPDFTool, SearchTool
-from config import DEFAULT_LLM_MODEL, VERBOSE
+from crewai.tasks.task_output import TaskOutput
+from tools import (
+    SummarizationTool, WebExtractor, ExtractContentFromPDFTool, SearchTool, KnowledgeBaseTool, SourceSearchTool
+)
+from context import ContextBudget
+from config import VERBOSE
+import llm as llm_registry
+
+# Bump when the task prompts change so checkpoints of older runs aren't resumed
+TASK_PROMPT_VERSION = "2"
 
 
 # Initialize the LLM
-def get_llm(model=None, temperature=0.2):
-    """Get LLM instance with specified parameters"""
-    return ChatOpenAI(
-        model=model or DEFAULT_LLM_MODEL,
-        temperature=temperature
+def get_llm(model=None, temperature=0.2, streaming=False):
+    """Get the crewai LLM agents run on, shared across agents"""
+    return llm_registry.get_agent_llm(model=model, temperature=temperature, streaming=streaming)
+
+def _chain_callbacks(callbacks):
+    """Combine several crew callbacks into one, or None if there are none"""
+    callbacks = [callback for callback in callbacks or [] if callback]
+    if not callbacks:
+        return None
+    
+    def run_all(output):
+        for callback in callbacks:
+            callback(output)
+    return run_all
+
+def _create_researcher(research_topic, llm, knowledge_base=None, research_index=None):
+    """Create the research agent with its search and extraction tools"""
+    researcher_tools = [
+        SearchTool(),
+        WebExtractor(knowledge_base=knowledge_base, research_index=research_index, topic=research_topic),
+        ExtractContentFromPDFTool(research_index=research_index, topic=research_topic)
+    ]
+    if knowledge_base is not None:
+        researcher_tools.insert(0, KnowledgeBaseTool(knowledge_base=knowledge_base))
+    if research_index is not None:
+        researcher_tools.append(SourceSearchTool(research_index=research_index, topic=research_topic))
+    
+    return Agent(
+        role="Senior Research Analyst",
+        goal=f"Find comprehensive and accurate information about {research_topic[:50]}",
+        backstory="""You are an expert at finding and collecting relevant information 
+                   from various sources. You have years of experience in research methodology
+                   and know how to evaluate the credibility of sources. You're thorough
+                   and always cite your sources.""",
+        verbose=VERBOSE,
+        allow_delegation=True,
+        tools=researcher_tools,
+        llm=llm,
+        respect_context_window=True
+    )
+
+def _knowledge_base_step(knowledge_base):
+    """Point the researcher at past research first when a knowledge base is available"""
+    return """
+        Before searching the web, query the knowledge_base tool. Fresh results there
+        count as sources; only search the web for aspects they don't cover or when
+        every result is marked STALE.
+        """ if knowledge_base is not None else ""
+
+def _source_search_step(research_index):
+    """Tell the researcher that extracted pages can be searched in full"""
+    return """
+        Extracted pages and PDFs are indexed in full, but web_extractor and
+        pdf_extractor only return the start of each. Use the source_search tool to
+        find the passages relevant to each aspect you research.
+        """ if research_index is not None else ""
+
+def create_subquestion_crew(question, research_topic, knowledge_base=None, research_index=None,
+                            step_callbacks=None, task_callbacks=None, context_budget=None):
+    """Create a single-researcher crew answering one sub-question of a topic
+    
+    Used by the research fan-out; several of these run at once, so each
+    gets its own agent and tools.
+    
+    Args:
+        question: The sub-question to research
+        research_topic: The topic the sub-question belongs to
+        knowledge_base: Optional KnowledgeBase the researcher checks before the web
+        research_index: Optional ResearchIndex extracted pages are chunked into, and searched
+            with the source_search tool
+        step_callbacks: Callables invoked with each agent step's output
+        task_callbacks: Callables invoked with the finished task's output
+        context_budget: ContextBudget bounding the researcher's conversation; a default
+            one is created if not given
+        
+    Returns:
+        A CrewAI Crew instance
+    """
+    researcher = _create_researcher(research_topic, get_llm(), knowledge_base=knowledge_base,
+                                    research_index=research_index)
+    (context_budget or ContextBudget()).bind(researcher, "researcher")
+    
+    subquestion_task = Task(
+        description=f"""
+        Research this question about {research_topic[:50]}: {question}
+        {_knowledge_base_step(knowledge_base)}{_source_search_step(research_index)}
+        Stay on this question; other researchers cover the rest of the topic.
+
+        1. Search for the latest information on this question
+        2. Find 2-3 credible sources
+        3. Extract relevant information from each source
+        4. Include URLs for all sources
+        5. Note any contradictory information you find
+
+        Your final answer should be a collection of structured findings with proper citations.
+        For each source, provide:
+        - Source URL or reference
+        - Key information extracted
+        - Date of publication/last update if available
+        """,
+        expected_output=(
+            "Concise, structured findings (200-400 words) answering the question, "
+            "with 2-3 citations in markdown format."
+        ),
+        agent=researcher
+    )
+    
+    return Crew(
+        agents=[researcher],
+        tasks=[subquestion_task],
+        verbose=VERBOSE,
+        process=Process.sequential,
+        step_callback=_chain_callbacks(step_callbacks),
+        task_callback=_chain_callbacks(task_callbacks)
     )
 
 # Create agents
-def create_research_crew(research_topic, use_memory=True):
+def create_research_crew(research_topic, use_memory=True, step_callbacks=None, task_callbacks=None,
+                         knowledge_base=None, streaming=False, context_budget=None, findings=None,
+                         analysis=None, research_index=None, checkpoints=None):
     """Create a crew of agents for research on the specified topic
     
     Args:
         research_topic: The topic to research
-        use_memory: Whether to enable agent memory
+        use_memory: Whether to enable the crew's memory
+        step_callbacks: Callables invoked with each agent step's output
+        task_callbacks: Callables invoked with each finished task's output
+        knowledge_base: Optional KnowledgeBase the researcher checks before the web,
+            and that extracted pages are added to
+        streaming: Whether agents stream their tokens to the active report stream
+        context_budget: ContextBudget bounding each agent's conversation and the task
+            outputs passed between agents; a default one is created if not given
+        findings: Research findings gathered beforehand (e.g. by the research fan-out).
+            When given, the crew skips the research task and starts at the analysis.
+        analysis: Analysis restored from a checkpoint. Only used along with `findings`;
+            the crew then starts at the report.
+        research_index: Optional ResearchIndex extracted pages are chunked into; the researcher
+            and analyst search it with the source_search tool
+        checkpoints: Optional CheckpointStore each finished task's output is saved to
         
     Returns:
         A CrewAI Crew instance
     """
     # Initialize tools
-    search_tool = SearchTool()
-    extraction_tool = WebExtractor()
-    summarization_tool = SummarizationTool()
-    pdf_tool = ExtractContentFromPDFTool()
+    analyst_tools = [SummarizationTool()]
+    if research_index is not None:
+        analyst_tools.append(SourceSearchTool(research_index=research_index, topic=research_topic))
     
-    # Default LLM
-    llm = get_llm()
+    # Default LLM; streaming models are separate shared instances
+    llm = get_llm(streaming=streaming)
     
-    # Create memory if enabled
-    researcher_memory = ConversationBufferMemory(memory_key="chat_history") if use_memory else None
-    analyst_memory = ConversationBufferMemory(memory_key="chat_history") if use_memory else None
-    writer_memory = ConversationBufferMemory(memory_key="chat_history") if use_memory else None
+    context_budget = context_budget or ContextBudget()
     
     # Truncate research topic
     truncated_topic = research_topic[:50]
     
     # Research Agent
-    researcher = Agent(
-        role="Senior Research Analyst",
-        goal=f"Find comprehensive and accurate information about {truncated_topic}",
-        backstory="""You are an expert at finding and collecting relevant information 
-                   from various sources. You have years of experience in research methodology
-                   and know how to evaluate the credibility of sources. You're thorough
-                   and always cite your sources.""",
-        verbose=VERBOSE,
-        allow_delegation=True,
-        tools=[search_tool, extraction_tool, pdf_tool],
-        llm=llm,
-        memory=researcher_memory
-    )
+    researcher = _create_researcher(research_topic, llm, knowledge_base=knowledge_base,
+                                    research_index=research_index)
     
     # Analysis Agent - uses a slightly higher temperature for more creative analysis
     analyst = Agent(
@@ -66,9 +182,9 @@ def create_research_crew(research_topic, use_memory=True):
                    You're skilled at prioritizing information based on relevance and importance.""",
         verbose=VERBOSE,
         allow_delegation=True,
-        tools=[summarization_tool ],
-        llm=get_llm(temperature=0.3),
-        memory=analyst_memory
+        tools=analyst_tools,
+        llm=get_llm(temperature=0.3, streaming=streaming),
+        respect_context_window=True
     )
     
     # Report Writer Agent
@@ -81,15 +197,20 @@ def create_research_crew(research_topic, use_memory=True):
                    all content is logically organized with a consistent style.""",
         verbose=VERBOSE,
         allow_delegation=False,
-        llm=get_llm(temperature=0.2),
-        memory=writer_memory
+        llm=get_llm(temperature=0.2, streaming=streaming),
+        respect_context_window=True
     )
     
+    # Each agent's conversation is summarized down to its own budget before it outgrows it
+    context_budget.bind(researcher, "researcher")
+    context_budget.bind(analyst, "analyst")
+    context_budget.bind(writer, "writer")
+    
     # Define tasks
     research_task = Task(
         description=f"""
         Research the topic: {truncated_topic}
-
+        {_knowledge_base_step(knowledge_base)}{_source_search_step(research_index)}
         Your job is to gather comprehensive information:
 
         1. Search for the latest information on this topic
@@ -170,13 +291,39 @@ def create_research_crew(research_topic, use_memory=True):
         context=[research_task, analysis_task]
     )
 
+    # Findings and analysis are compacted to the budget before later tasks get them as context
+    context_budget.compact_outputs_of(research_task, analysis_task)
+    
+    agents = [researcher, analyst, writer]
+    tasks = [research_task, analysis_task, report_task]
+    # Later tasks read earlier tasks' outputs as context, so outputs produced beforehand
+    # (by the fan-out, or before a failed run) stand in for the tasks that produced them
+    for task, agent, output in [(research_task, researcher, findings), (analysis_task, analyst, analysis)]:
+        if output is None:
+            break
+        task.output = TaskOutput(
+            description=task.description,
+            raw=context_budget.compact(output, source=f"task:{agent.role}"),
+            agent=agent.role
+        )
+        agents.remove(agent)
+        tasks.remove(task)
+    
+    if checkpoints is not None:
+        checkpoints.track(research=research_task, analysis=analysis_task, report=report_task)
     
     # Create the crew
     crew = Crew(
-        agents=[researcher, analyst, writer],
-        tasks=[research_task, analysis_task, report_task],
+        agents=agents,
+        tasks=tasks,
         verbose=VERBOSE,
-        process=Process.sequential
+        process=Process.sequential,
+        memory=use_memory,
+        step_callback=_chain_callbacks(step_callbacks),
+        # Outputs are checkpointed after compaction, as later tasks see them
+        task_callback=_chain_callbacks([
+            *(task_callbacks or []), context_budget.on_task, checkpoints and checkpoints.on_task
+        ])
     )
     
     return crew
@@ -0,0 +1,445 @@
+from datetime import datetime
+from fakes import FakeServer, lorem, make_text_pdf
+import numpy as np
+import subprocess
+import statistics
+import platform
+import argparse
+import tempfile
+import json
+import time
+import sys
+import os
+
+
+def configure_environment(server, workdir):
+    """Point every client at the fake server and every cache at a scratch directory
+
+    Must run before any project module is imported, since config reads the
+    environment at import time.
+    """
+    os.environ.update({
+        "OPENAI_API_KEY": "fake-key",
+        "TAVILY_API_KEY": "fake-key",
+        "OPENAI_BASE_URL": server.openai_base_url,
+        "OPENAI_API_BASE": server.openai_base_url,
+        "TAVILY_API_URL": server.url,
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+    })
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_index(server, workdir, args):
+    """ResearchIndex add and query throughput as the corpus grows"""
+    from indexing import ResearchIndex
+
+    index = ResearchIndex(persist_dir=os.path.join(workdir, "bench_index"), use_embedding_cache=False)
+    rows, indexed = [], 0
+    for size in args.index_sizes:
+        docs = [
+            {"content": lorem(300, seed=i), "metadata": {"topic": "benchmark", "type": "source"}}
+            for i in range(indexed, size)
+        ]
+        calls = server.counts["embedding"]
+        seconds, _ = timed(index.add_documents, docs)
+        indexed = size
+
+        queries = [lorem(8, seed=q) for q in range(args.queries)]
+        latencies = [timed(index.query, query)[0] for query in queries]
+        retrieve_latencies = [timed(index.retrieve, query)[0] for query in queries]
+        batch_seconds, _ = timed(index.retrieve_many, queries)
+        rows.append({
+            "case": f"corpus={size}",
+            "added": len(docs),
+            "add_seconds": seconds,
+            "add_docs_per_second": len(docs) / seconds if seconds else None,
+            "embedding_requests": server.counts["embedding"] - calls,
+            "query_mean_seconds": statistics.mean(latencies),
+            "query_p95_seconds": sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+            "retrieve_mean_seconds": statistics.mean(retrieve_latencies),
+            "retrieve_many_seconds": batch_seconds,
+        })
+    return rows
+
+
+VECTOR_BACKENDS = ("chroma", "faiss-flat", "faiss-ivf", "faiss-hnsw")
+
+
+def _random_vectors(rng, count, dim):
+    vectors = rng.standard_normal((count, dim), dtype="float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _open_vector_store(backend, path, size):
+    """Open (or reopen) a vector store for the vectors suite"""
+    if backend == "chroma":
+        import chromadb
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+        collection = chromadb.PersistentClient(path).get_or_create_collection("bench")
+        return ChromaVectorStore(chroma_collection=collection)
+
+    from vector_store import FaissVectorStore
+    index_type = backend.split("-", 1)[1]
+    # Scale the number of IVF lists with the corpus (about sqrt(n)) so every size gets trained
+    return FaissVectorStore(path, index_type=index_type, nlist=max(16, int(size ** 0.5)),
+                            snapshot_interval=size + 1)
+
+
+def bench_vectors(server, workdir, args):
+    """Chroma against FAISS (flat, IVF, HNSW) on random unit vectors
+
+    Embeddings are generated locally, so this measures only the vector
+    stores: insert throughput, time to reopen a persisted store and answer
+    a first query, query latency, and recall@k against exact search.
+    """
+    from llama_index.core.schema import TextNode
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+
+    rows = []
+    top_k = 10
+    for size in args.vector_sizes:
+        queries = _random_vectors(np.random.default_rng(size), args.queries, args.vector_dim)
+        starts = range(0, size, args.vector_batch)
+
+        def batch(start):
+            # Each batch is seeded by its position, so it can be regenerated instead of kept in memory
+            count = min(args.vector_batch, size - start)
+            return _random_vectors(np.random.default_rng([size, start]), count, args.vector_dim)
+
+        # Ground truth from exact search, merged batch by batch
+        truth_scores = np.empty((len(queries), 0), dtype="float32")
+        truth_ids = np.empty((len(queries), 0), dtype="int64")
+        for start in starts:
+            vectors = batch(start)
+            scores = np.hstack([truth_scores, queries @ vectors.T])
+            ids = np.hstack([truth_ids, np.tile(np.arange(start, start + len(vectors)), (len(queries), 1))])
+            best = np.argsort(-scores, axis=1)[:, :top_k]
+            truth_scores = np.take_along_axis(scores, best, axis=1)
+            truth_ids = np.take_along_axis(ids, best, axis=1)
+
+        for backend in args.vector_backends:
+            path = os.path.join(workdir, f"vectors_{backend}_{size}")
+            store = _open_vector_store(backend, path, size)
+
+            add_seconds = 0.0
+            for start in starts:
+                nodes = [
+                    TextNode(text=f"chunk {start + i}", id_=str(start + i), embedding=vector.tolist())
+                    for i, vector in enumerate(batch(start))
+                ]
+                seconds, _ = timed(store.add, nodes)
+                add_seconds += seconds
+            if hasattr(store, "close"):
+                store.close()
+            del store
+
+            # Reopen from disk, as a new process would
+            open_seconds, store = timed(_open_vector_store, backend, path, size)
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth_ids):
+                seconds, result = timed(store.query, VectorStoreQuery(
+                    query_embedding=query.tolist(), similarity_top_k=top_k
+                ))
+                latencies.append(seconds)
+                hits += len({int(node_id) for node_id in result.ids} & set(expected.tolist()))
+            if hasattr(store, "close"):
+                store.close()
+
+            rows.append({
+                "case": f"{backend} n={size}",
+                "add_seconds": add_seconds,
+                "add_vectors_per_second": size / add_seconds if add_seconds else None,
+                "open_seconds": open_seconds,
+                "first_query_seconds": latencies[0],
+                "query_mean_seconds": statistics.mean(latencies),
+                "query_p95_seconds": sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+                f"recall_at_{top_k}": hits / (top_k * len(queries)),
+            })
+            print(f"  {rows[-1]['case']}: add {add_seconds:.1f}s, open {open_seconds:.3f}s, "
+                  f"query {rows[-1]['query_mean_seconds'] * 1000:.2f}ms")
+    return rows
+
+
+def bench_summarize(server, workdir, args):
+    """Summarization latency against input size"""
+    from summarization import map_reduce_summarize
+
+    rows = []
+    for words in args.summary_sizes:
+        text = lorem(words, seed=words)
+        calls = server.counts["llm"]
+        seconds, _ = timed(map_reduce_summarize, text)
+        warm_seconds, _ = timed(map_reduce_summarize, text)
+        rows.append({
+            "case": f"words={words}",
+            "characters": len(text),
+            "seconds": seconds,
+            "warm_seconds": warm_seconds,
+            "llm_requests": server.counts["llm"] - calls,
+        })
+    return rows
+
+
+def bench_pdf(server, workdir, args):
+    """PDF extraction speed, cold and from the page cache"""
+    from pdf import iter_pdf_pages
+
+    def extract(path):
+        return "\n".join(text for _, text in iter_pdf_pages(path))
+
+    rows = []
+    for pages in args.pdf_pages:
+        path = make_text_pdf(os.path.join(workdir, f"bench_{pages}.pdf"), pages)
+        seconds, content = timed(extract, path)
+        warm_seconds, _ = timed(extract, path)
+        rows.append({
+            "case": f"pages={pages}",
+            "characters": len(content),
+            "seconds": seconds,
+            "pages_per_second": pages / seconds if seconds else None,
+            "warm_seconds": warm_seconds,
+        })
+    return rows
+
+
+def bench_web(server, workdir, args):
+    """Concurrent search and page extraction, cold and cached"""
+    from tools import SearchTool, WebExtractor
+
+    search_tool, extractor = SearchTool(), WebExtractor()
+    queries = [f"benchmark query {i}" for i in range(args.web_queries)]
+    rows = []
+
+    seconds, results = timed(search_tool.search_many, queries)
+    warm_seconds, _ = timed(search_tool.search_many, queries)
+    rows.append({"case": f"search queries={len(queries)}", "seconds": seconds, "warm_seconds": warm_seconds})
+
+    urls = [result["url"] for batch in results if isinstance(batch, list) for result in batch]
+    seconds, _ = timed(extractor.extract_many, urls)
+    warm_seconds, _ = timed(extractor.extract_many, urls)
+    rows.append({"case": f"pages={len(urls)}", "seconds": seconds, "warm_seconds": warm_seconds})
+    return rows
+
+
+def bench_e2e(server, workdir, args):
+    """End-to-end wall time of a research crew against the fake services
+
+    Each run is repeated with streaming on, which also measures how soon the
+    first output and the first streamed token reach the report.
+    """
+    from agents import create_research_crew
+    from streaming import ReportStream, use_report_stream
+
+    rows = []
+    for run in range(args.e2e_runs):
+        for stream in (False, True):
+            before = dict(server.counts)
+            topic = f"benchmark topic {run}"
+            report_stream = ReportStream(os.path.join(workdir, f"e2e_report_{run}.md"), topic,
+                                         upstream_tasks=2, echo=False) if stream else None
+            crew = create_research_crew(topic, use_memory=False, streaming=stream,
+                                        task_callbacks=[report_stream and report_stream.on_task])
+            with use_report_stream(report_stream):
+                seconds, result = timed(crew.kickoff)
+            row = {
+                "case": f"run={run}" + (" stream" if stream else ""),
+                "seconds": seconds,
+                **{f"{route}_requests": server.counts[route] - before[route] for route in server.counts},
+            }
+            if report_stream is not None:
+                stats = report_stream.finish(str(result))
+                row["time_to_first_output"] = stats["time_to_first_output"]
+                row["time_to_first_token"] = stats["time_to_first_token"]
+            rows.append(row)
+    return rows
+
+
+HEAVY_FRAMEWORKS = ("crewai", "langchain", "langchain_core", "langchain_openai", "llama_index",
+                    "chromadb", "openai", "faiss", "tiktoken")
+
+
+def _import_times(stderr):
+    """Parse `python -X importtime` output
+
+    Returns:
+        Total import seconds, and cumulative seconds per top-level package
+    """
+    total, packages = 0.0, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        seconds = int(cumulative) / 1e6
+        # Nested imports are indented by two spaces per level
+        if not name[1:].startswith(" "):
+            total += seconds
+        root = name.strip().split(".")[0]
+        packages[root] = max(packages.get(root, 0.0), seconds)
+    return total, packages
+
+
+def bench_startup(server, workdir, args):
+    """CLI startup cost, measured in fresh interpreters with `python -X importtime`
+
+    `import agents` loads every framework a run needs, for comparison with
+    what the CLI pays before it gets to work.
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    commands = {
+        "import main": [sys.executable, "-X", "importtime", "-c", "import main"],
+        "run.py --help": [sys.executable, "-X", "importtime", "run.py", "--help"],
+        "import agents": [sys.executable, "-X", "importtime", "-c", "import agents"],
+    }
+    rows = []
+    for case, command in commands.items():
+        wall_times, import_times, packages = [], [], {}
+        for _ in range(args.startup_runs):
+            start = time.perf_counter()
+            process = subprocess.run(command, capture_output=True, text=True, cwd=repo_dir)
+            wall_times.append(time.perf_counter() - start)
+            import_seconds, packages = _import_times(process.stderr)
+            import_times.append(import_seconds)
+        slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+        rows.append({
+            "case": case,
+            "seconds": statistics.median(wall_times),
+            "import_seconds": statistics.median(import_times),
+            "frameworks_loaded": sorted(name for name in packages if name in HEAVY_FRAMEWORKS),
+            "slowest_imports": [[name, round(seconds, 4)] for name, seconds in slowest[:10]],
+        })
+    return rows
+
+
+SUITES = {
+    "index": bench_index,
+    "summarize": bench_summarize,
+    "pdf": bench_pdf,
+    "web": bench_web,
+    "e2e": bench_e2e,
+    "vectors": bench_vectors,
+    "startup": bench_startup,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Print timing changes against an earlier results file and return the regressions"""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+
+    regressions = []
+    print(f"\nComparison against {baseline_path}:")
+    for suite, rows in results["suites"].items():
+        old_rows = {row["case"]: row for row in baseline.get("suites", {}).get(suite, [])}
+        for row in rows:
+            old = old_rows.get(row["case"])
+            if not old:
+                continue
+            for metric, value in row.items():
+                if not metric.endswith("seconds") or not isinstance(value, (int, float)):
+                    continue
+                old_value = old.get(metric)
+                if not old_value:
+                    continue
+                ratio = value / old_value
+                flag = "  REGRESSION" if ratio > threshold else ""
+                print(f"  {suite:<10} {row['case']:<16} {metric:<22} {old_value:>9.4f} -> {value:>9.4f} ({ratio:.2f}x){flag}")
+                if flag:
+                    regressions.append((suite, row["case"], metric, ratio))
+    return regressions
+
+
+def parse_sizes(value):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ResearchGPT offline benchmarks")
+    parser.add_argument("--suites", type=str, default="startup,index,summarize,pdf,web,e2e",
+                        help=f"Comma-separated suites to run ({', '.join(SUITES)})")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM latency in seconds")
+    parser.add_argument("--embedding-latency", type=float, default=0.01, help="Fake embedding latency in seconds")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Fake search latency in seconds")
+    parser.add_argument("--page-latency", type=float, default=0.02, help="Fake page fetch latency in seconds")
+    parser.add_argument("--index-sizes", type=parse_sizes, default=[100, 500, 1000],
+                        help="Corpus sizes at which index throughput is measured")
+    parser.add_argument("--queries", type=int, default=10, help="Queries per corpus size")
+    parser.add_argument("--summary-sizes", type=parse_sizes, default=[1000, 10000, 50000],
+                        help="Input sizes (words) for the summarization suite")
+    parser.add_argument("--pdf-pages", type=parse_sizes, default=[10, 100],
+                        help="Page counts for the PDF suite")
+    parser.add_argument("--web-queries", type=int, default=10, help="Queries for the web suite")
+    parser.add_argument("--e2e-runs", type=int, default=1, help="End-to-end crew runs")
+    parser.add_argument("--vector-sizes", type=parse_sizes, default=[10000, 100000, 1000000],
+                        help="Corpus sizes (chunks) for the vectors suite")
+    parser.add_argument("--vector-dim", type=int, default=384, help="Vector dimension for the vectors suite")
+    parser.add_argument("--vector-batch", type=int, default=5000, help="Vectors added per call in the vectors suite")
+    parser.add_argument("--vector-backends", type=lambda value: [part.strip() for part in value.split(",") if part.strip()],
+                        default=list(VECTOR_BACKENDS),
+                        help="Vector stores compared by the vectors suite")
+    parser.add_argument("--startup-runs", type=int, default=5,
+                        help="Interpreter launches per case in the startup suite")
+    parser.add_argument("--output", type=str, help="Results file (defaults to output/benchmarks/)")
+    parser.add_argument("--compare", type=str, help="Earlier results file to compare against")
+    parser.add_argument("--regression-threshold", type=float, default=1.2,
+                        help="Slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+    unknown = [suite for suite in suites if suite not in SUITES]
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(unknown)}")
+    unknown = [backend for backend in args.vector_backends if backend not in VECTOR_BACKENDS]
+    if unknown:
+        parser.error(f"unknown vector backends: {', '.join(unknown)}")
+
+    latency = {
+        "llm": args.llm_latency,
+        "embedding": args.embedding_latency,
+        "search": args.search_latency,
+        "page": args.page_latency,
+    }
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "latency": latency,
+        "suites": {},
+    }
+
+    with tempfile.TemporaryDirectory() as workdir, FakeServer(latency=latency) as server:
+        configure_environment(server, workdir)
+        for suite in suites:
+            print(f"Running {suite} benchmark...")
+            results["suites"][suite] = SUITES[suite](server, workdir, args)
+
+    output = args.output or os.path.join(
+        "output", "benchmarks", f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["suites"], indent=2))
+    print(f"\nResults saved to {output}")
+
+    if args.compare and compare(results, args.compare, args.regression_threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from cache import DiskCache, cache_key
+from config import OUTPUT_DIR, DEFAULT_LLM_MODEL
+from datetime import datetime
+import json
+import os
+
+# Task names in the order the crew runs them
+TASKS = ("research", "analysis", "report")
+
+# Written to every session directory, so a resumed run can find its topic's sessions
+SESSION_FILE = "session.json"
+
+
+def record_session(session_dir, topic):
+    """Record which topic a session directory belongs to"""
+    with open(os.path.join(session_dir, SESSION_FILE), "w", encoding="utf-8") as f:
+        json.dump({"topic": topic, "created_at": datetime.now().isoformat()}, f)
+
+
+def _session_topic(session_dir):
+    try:
+        with open(os.path.join(session_dir, SESSION_FILE), "r", encoding="utf-8") as f:
+            return json.load(f).get("topic")
+    except (OSError, ValueError):
+        return None
+
+
+class CheckpointStore:
+    """Saves each finished task's output in the session directory so a failed run can resume
+
+    Checkpoints are keyed by topic, task, model and task prompt version, so
+    a resumed run never picks up output produced by a different model or
+    from prompts that have since changed. The checkpoints folder is only
+    created once the first task finishes.
+    """
+
+    def __init__(self, session_dir, topic, prompt_version, model=DEFAULT_LLM_MODEL):
+        """Initialize the store
+
+        Args:
+            session_dir: Session directory; checkpoints live in its "checkpoints" folder
+            topic: The research topic
+            prompt_version: Version of the task prompts the outputs were produced with
+            model: Model the outputs were produced with
+        """
+        self.topic = topic
+        self.prompt_version = prompt_version
+        self.model = model
+        self.directory = os.path.join(session_dir, "checkpoints")
+        self._cache = None
+        self._task_names = {}
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = DiskCache(self.directory)
+        return self._cache
+
+    def _key(self, task_name):
+        return cache_key(self.topic, task_name, self.model, self.prompt_version)
+
+    def load(self, task_name):
+        """The saved output of a task, or None if it hasn't finished in this session"""
+        if self._cache is None and not os.path.isdir(self.directory):
+            return None
+        entry = self.cache.get(self._key(task_name))
+        return entry["output"] if entry else None
+
+    def save(self, task_name, output):
+        self.cache.set(self._key(task_name), {
+            "topic": self.topic,
+            "task": task_name,
+            "model": self.model,
+            "prompt_version": self.prompt_version,
+            "created_at": datetime.now().isoformat(),
+            "output": output
+        })
+
+    def load_completed(self):
+        """Outputs of the tasks that finished in order, stopping at the first missing one
+
+        A later task's checkpoint is only usable if everything it built on is too.
+        """
+        completed = {}
+        for task_name in TASKS:
+            output = self.load(task_name)
+            if output is None:
+                break
+            completed[task_name] = output
+        return completed
+
+    def track(self, **tasks):
+        """Save the outputs of these crew tasks, by name, as they finish"""
+        self._task_names.update({task.description: name for name, task in tasks.items()})
+
+    def on_task(self, task_output):
+        """Crew task callback: checkpoint a tracked task's output"""
+        task_name = self._task_names.get(getattr(task_output, "description", None))
+        if task_name is not None:
+            self.save(task_name, str(getattr(task_output, "raw", task_output)))
+
+
+def find_session_dir(topic, prompt_version, model=DEFAULT_LLM_MODEL, output_dir=OUTPUT_DIR):
+    """The most recent session directory of a topic with a resumable checkpoint, or None
+
+    A session qualifies if it was recorded for exactly this topic and holds at
+    least one checkpoint made with this model and prompt version. Sessions
+    where every task is checkpointed already finished and are skipped.
+    """
+    try:
+        names = sorted(os.listdir(output_dir), reverse=True)
+    except FileNotFoundError:
+        return None
+    # Session directories start with a timestamp, so newest sort first
+    for name in names:
+        session_dir = os.path.join(output_dir, name)
+        if _session_topic(session_dir) != topic:
+            continue
+        checkpoints = CheckpointStore(session_dir, topic, prompt_version, model)
+        completed = [checkpoints.load(task_name) is not None for task_name in TASKS]
+        if any(completed) and not all(completed):
+            return session_dir
+    return None
@@ -12,10 +12,115 @@ TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 DEFAULT_LLM_MODEL = os.getenv("MODEL_NAME", "gpt-4o")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
+# LLM client configurations
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_RESPONSE_CACHE = os.getenv("LLM_RESPONSE_CACHE", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+
+# Indexing configurations
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "32"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+
+# Vector store configurations: "chroma" or "faiss"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")  # flat, ivf or hnsw
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "1024"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+FAISS_SNAPSHOT_INTERVAL = int(os.getenv("FAISS_SNAPSHOT_INTERVAL", "10000"))
+
+# Metadata log compaction: compact once dead records reach this count and ratio of live ones
+METADATA_COMPACT_MIN_RECORDS = int(os.getenv("METADATA_COMPACT_MIN_RECORDS", "1000"))
+METADATA_COMPACT_RATIO = float(os.getenv("METADATA_COMPACT_RATIO", "0.5"))
+
+# Cache configurations (shared across sessions)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join("output", "cache"))
+
+# Embedding cache configurations
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(CACHE_DIR, "embeddings"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
+
+# Web extraction configurations
+WEB_CACHE_DIR = os.getenv("WEB_CACHE_DIR", os.path.join(CACHE_DIR, "web"))
+WEB_CACHE_TTL = int(os.getenv("WEB_CACHE_TTL", str(24 * 3600)))
+WEB_MAX_CONNECTIONS = int(os.getenv("WEB_MAX_CONNECTIONS", "20"))
+WEB_PER_HOST_LIMIT = int(os.getenv("WEB_PER_HOST_LIMIT", "4"))
+WEB_TIMEOUT = float(os.getenv("WEB_TIMEOUT", "20"))
+
+# Search configurations
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com")
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "5"))
+SEARCH_CACHE_DIR = os.getenv("SEARCH_CACHE_DIR", os.path.join(CACHE_DIR, "search"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", str(6 * 3600)))
+SEARCH_CACHE_MEMORY_ENTRIES = int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", "1000"))
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "4"))
+
+# Ingestion pipeline configurations: full pages are chunked into the session index
+INGEST_CHUNK_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "512"))
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "50"))
+INGEST_FETCH_BATCH = int(os.getenv("INGEST_FETCH_BATCH", "8"))
+INGEST_QUEUE_PAGES = int(os.getenv("INGEST_QUEUE_PAGES", "16"))
+SOURCE_SEARCH_TOP_K = int(os.getenv("SOURCE_SEARCH_TOP_K", "5"))
+
+# Summarization configurations
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+SUMMARY_CHUNK_OVERLAP = int(os.getenv("SUMMARY_CHUNK_OVERLAP", "100"))
+SUMMARY_REDUCE_TOKENS = int(os.getenv("SUMMARY_REDUCE_TOKENS", "6000"))
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "4"))
+SUMMARY_CACHE_DIR = os.getenv("SUMMARY_CACHE_DIR", os.path.join(CACHE_DIR, "summaries"))
+
+# PDF extraction configurations
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(CACHE_DIR, "pdf_pages"))
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_PAGE_BATCH = int(os.getenv("PDF_PAGE_BATCH", "8"))
+
+# Context budget configurations: token budgets for what each agent sees
+CONTEXT_OUTPUT_TOKENS = int(os.getenv("CONTEXT_OUTPUT_TOKENS", "1500"))  # per upstream task output
+# Conversation budgets: each agent's earlier steps are summarized once its prompt outgrows them
+RESEARCHER_CONTEXT_TOKENS = int(os.getenv("RESEARCHER_CONTEXT_TOKENS", "12000"))
+ANALYST_CONTEXT_TOKENS = int(os.getenv("ANALYST_CONTEXT_TOKENS", "8000"))
+WRITER_CONTEXT_TOKENS = int(os.getenv("WRITER_CONTEXT_TOKENS", "8000"))
+CONTEXT_CACHE_DIR = os.getenv("CONTEXT_CACHE_DIR", os.path.join(CACHE_DIR, "context"))
+
+# Near-duplicate detection configurations: MinHash LSH over word shingles, per research session
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))  # estimated Jaccard similarity
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "16"))
+DEDUP_SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "5"))
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "30"))
+
+# Research fan-out configurations: split the research stage into concurrent sub-questions
+FAN_OUT_SUBQUESTIONS = int(os.getenv("FAN_OUT_SUBQUESTIONS", "0"))  # 0 or 1 researches the topic as a whole
+FAN_OUT_CONCURRENCY = int(os.getenv("FAN_OUT_CONCURRENCY", "4"))
+
+# Knowledge base configurations (shared across sessions)
+KNOWLEDGE_BASE_DIR = os.getenv("KNOWLEDGE_BASE_DIR", os.path.join("output", "knowledge_base"))
+KB_MAX_AGE_DAYS = float(os.getenv("KB_MAX_AGE_DAYS", "30"))
+KB_MIN_SCORE = float(os.getenv("KB_MIN_SCORE", "0.3"))  # Cosine similarity; lower-scoring hits are dropped
+KB_TOP_K = int(os.getenv("KB_TOP_K", "5"))
+
+# Batch mode configurations
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "3"))
+BATCH_TOPIC_TIMEOUT = float(os.getenv("BATCH_TOPIC_TIMEOUT", "1800"))
+
+# Server mode configurations
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8765"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "3"))
+SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "100"))
+SERVER_MAX_JOBS = int(os.getenv("SERVER_MAX_JOBS", "1000"))
+
 # Agent configurations
 MAX_ITERATIONS = 5
 VERBOSE = True
 
 # Path configurations
-OUTPUT_DIR = "output"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
\ No newline at end of file
+# Created by whatever first writes to it, so importing config has no side effects
+OUTPUT_DIR = "output"
\ No newline at end of file
@@ -0,0 +1,206 @@
+from cache import DiskCache, cache_key
+from summarization import PROMPT_VERSION, count_tokens, truncate_tokens, map_reduce_summarize
+from llm import get_llm
+from tracing import trace_span
+from config import (
+    CONTEXT_OUTPUT_TOKENS, CONTEXT_CACHE_DIR,
+    RESEARCHER_CONTEXT_TOKENS, ANALYST_CONTEXT_TOKENS, WRITER_CONTEXT_TOKENS
+)
+import threading
+import weakref
+
+# Summaries run about 0.75 words per token; aim a little lower to leave headroom
+WORDS_PER_TOKEN = 0.6
+
+# Smallest budget an agent's earlier steps are summarized to, however full its prompt is
+MIN_HISTORY_TOKENS = 200
+
+_compaction_cache = None
+# Agent -> (ContextBudget, token budget) for the agents whose conversations are bounded
+_agent_budgets = weakref.WeakKeyDictionary()
+_agent_budgets_lock = threading.Lock()
+_hook_registered = False
+
+
+def _get_compaction_cache():
+    global _compaction_cache
+    if _compaction_cache is None:
+        _compaction_cache = DiskCache(CONTEXT_CACHE_DIR)
+    return _compaction_cache
+
+
+def _message_text(message):
+    content = message.get("content")
+    return content if isinstance(content, str) else str(content or "")
+
+
+def _fit_agent_context(context):
+    """crewai before_llm_call hook: compact the calling agent's conversation to its budget"""
+    with _agent_budgets_lock:
+        entry = _agent_budgets.get(context.agent) if context.agent is not None else None
+    if entry is None:
+        return None
+    budget, max_tokens = entry
+    role = str(getattr(context.agent, "role", "") or "agent").strip()
+    budget.fit_messages(context.messages, max_tokens, source=f"memory:{role}")
+    return None
+
+
+def _register_hook():
+    """Install the budget hook once; crewai copies global hooks into each new agent executor"""
+    global _hook_registered
+    from crewai.hooks import register_before_llm_call_hook
+
+    with _agent_budgets_lock:
+        if not _hook_registered:
+            register_before_llm_call_hook(_fit_agent_context)
+            _hook_registered = True
+
+
+class ContextBudget:
+    """Keeps what each agent sees within a token budget and accounts for the tokens saved
+
+    The outputs of upstream tasks are compacted before downstream tasks
+    receive them as context. Each bound agent's conversation (its prompt,
+    tool calls and their results) is also held to that agent's budget: before
+    every LLM call, the steps between the task prompt and the latest turn are
+    summarized once the conversation outgrows it. Compactions are cached by
+    content, so the same findings are only summarized once across runs.
+    """
+
+    def __init__(self, output_tokens=CONTEXT_OUTPUT_TOKENS, llm=None, agent_tokens=None):
+        """Initialize the budget
+
+        Args:
+            output_tokens: Budget for each upstream task output passed on as context
+            llm: Chat model used for summaries. Defaults to the configured model at temperature 0.
+            agent_tokens: Conversation budget per agent name ("researcher", "analyst", "writer");
+                defaults to the configured budgets
+        """
+        self.output_tokens = output_tokens
+        self.agent_tokens = {
+            "researcher": RESEARCHER_CONTEXT_TOKENS,
+            "analyst": ANALYST_CONTEXT_TOKENS,
+            "writer": WRITER_CONTEXT_TOKENS,
+            **(agent_tokens or {})
+        }
+        self._llm = llm
+        self._compacted_tasks = set()
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    @property
+    def llm(self):
+        return self._llm or get_llm(temperature=0)
+
+    def record(self, source, tokens_before, tokens_after, cache_hit=False):
+        """Account for text of `tokens_before` tokens that was cut down to `tokens_after`"""
+        with self._lock:
+            entry = self._sources.setdefault(source, {
+                "count": 0, "tokens_before": 0, "tokens_after": 0, "cache_hits": 0
+            })
+            entry["count"] += 1
+            entry["tokens_before"] += tokens_before
+            entry["tokens_after"] += tokens_after
+            entry["cache_hits"] += int(cache_hit)
+
+    def compact(self, text, max_tokens=None, source="text"):
+        """Cut text down to `max_tokens` tokens, summarizing it if it is over budget
+
+        Text within budget is returned unchanged. Compactions are served from
+        the cache when the same text was compacted to the same budget before.
+        """
+        max_tokens = max_tokens or self.output_tokens
+        tokens = count_tokens(text)
+        if tokens <= max_tokens:
+            return text
+
+        llm = self.llm
+        cache = _get_compaction_cache()
+        key = cache_key(PROMPT_VERSION, llm.model_name, max_tokens, text)
+        with trace_span("context.compact", "context", tokens_before=tokens) as span:
+            compacted = cache.get(key)
+            cache_hit = compacted is not None
+            if not cache_hit:
+                compacted = map_reduce_summarize(text, max_words=int(max_tokens * WORDS_PER_TOKEN), llm=llm)
+                compacted = truncate_tokens(compacted, max_tokens)
+                cache.set(key, compacted)
+            compacted_tokens = count_tokens(compacted)
+            span.set(tokens_after=compacted_tokens, tokens_saved=tokens - compacted_tokens)
+        self.record(source, tokens, compacted_tokens, cache_hit)
+        return compacted
+
+    def bind(self, agent, name):
+        """Hold a crewai agent's conversation to the budget for `name`
+
+        Returns:
+            The agent, for chaining
+        """
+        max_tokens = self.agent_tokens.get(name)
+        if max_tokens:
+            _register_hook()
+            with _agent_budgets_lock:
+                _agent_budgets[agent] = (self, max_tokens)
+        return agent
+
+    def fit_messages(self, messages, max_tokens, source="memory"):
+        """Compact a conversation in place to about `max_tokens` tokens
+
+        System messages, the task prompt and the latest turn (the last
+        assistant message and the tool results answering it) are kept
+        verbatim; the steps in between are replaced by a summary.
+        """
+        tokens = [count_tokens(_message_text(message)) for message in messages]
+        if sum(tokens) <= max_tokens:
+            return
+        
+        head = 0
+        while head < len(messages) and messages[head].get("role") == "system":
+            head += 1
+        head += 1  # the task prompt
+        # Tool results must follow the assistant message that called them
+        tail = len(messages) - 1
+        for index in range(len(messages) - 1, head - 1, -1):
+            if messages[index].get("role") == "assistant":
+                tail = index
+                break
+        if tail <= head:
+            return
+        
+        history = "\n\n".join(
+            f"{message.get('role', 'user')}: {_message_text(message)}" for message in messages[head:tail]
+        )
+        kept = sum(tokens) - sum(tokens[head:tail])
+        summary = self.compact(history, max_tokens=max(max_tokens - kept, MIN_HISTORY_TOKENS), source=source)
+        # In place: the agent executor keeps using this list
+        messages[head:tail] = [{"role": "user", "content": f"Summary of your earlier steps:\n{summary}"}]
+
+    def compact_outputs_of(self, *tasks):
+        """Compact the outputs of these tasks before downstream tasks see them"""
+        self._compacted_tasks.update(task.description for task in tasks)
+
+    def on_task(self, task_output):
+        """Crew task callback: compact an upstream task's output in place
+
+        Downstream tasks build their context from the finished task's output,
+        so replacing it here shrinks every prompt that includes it.
+        """
+        if getattr(task_output, "description", None) not in self._compacted_tasks:
+            return
+        agent = str(getattr(task_output, "agent", "") or "task").strip()
+        task_output.raw = self.compact(task_output.raw, source=f"task:{agent}")
+
+    def stats(self):
+        """Tokens before and after compaction, in total and per source"""
+        with self._lock:
+            sources = {name: dict(entry) for name, entry in self._sources.items()}
+        for entry in sources.values():
+            entry["tokens_saved"] = entry["tokens_before"] - entry["tokens_after"]
+        return {
+            "tokens_before": sum(entry["tokens_before"] for entry in sources.values()),
+            "tokens_after": sum(entry["tokens_after"] for entry in sources.values()),
+            "tokens_saved": sum(entry["tokens_saved"] for entry in sources.values()),
+            "compactions": sum(entry["count"] for entry in sources.values()),
+            "cache_hits": sum(entry["cache_hits"] for entry in sources.values()),
+            "sources": sources,
+        }
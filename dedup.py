@@ -0,0 +1,175 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_BANDS, DEDUP_SHINGLE_WORDS, DEDUP_MIN_WORDS
+import numpy as np
+import threading
+import zlib
+import re
+
+_current_index = ContextVar("current_dedup_index", default=None)
+
+_WORD = re.compile(r"\w+")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Shingles hashed per step, so long pages don't need a shingles x permutations matrix at once
+_SHINGLE_BLOCK = 2048
+
+
+class MinHasher:
+    """MinHash signatures over word shingles
+
+    The Jaccard similarity of two texts' shingle sets is estimated by the
+    fraction of signature positions where they agree.
+    """
+
+    def __init__(self, num_perm=DEDUP_NUM_PERM, shingle_words=DEDUP_SHINGLE_WORDS, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        self._a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+    def shingles(self, words):
+        k = self.shingle_words
+        if len(words) <= k:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+    def signature(self, words):
+        """MinHash signature of a list of normalized words"""
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in self.shingles(words)), dtype=np.uint64
+        )
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), _SHINGLE_BLOCK):
+            block = hashes[start:start + _SHINGLE_BLOCK, None]
+            permuted = ((block * self._a + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+        return signature
+
+
+class NearDuplicateIndex:
+    """Session-wide MinHash LSH index of the texts seen so far
+
+    Texts are grouped into namespaces (web pages, PDFs, summary inputs,
+    index chunks, ...) and only compared within their own namespace.
+    Signatures are split into bands; texts sharing any band are candidates,
+    and a candidate counts as a near-duplicate once its estimated Jaccard
+    similarity reaches the threshold. Texts shorter than `min_words` are
+    never treated as duplicates.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS,
+                 shingle_words=DEDUP_SHINGLE_WORDS, min_words=DEDUP_MIN_WORDS):
+        """Initialize the index
+
+        Args:
+            threshold: Estimated Jaccard similarity at which two texts are near-duplicates
+            num_perm: Number of MinHash permutations per signature
+            bands: Number of LSH bands; must divide num_perm. More bands find
+                more candidates at lower similarities.
+            shingle_words: Number of words per shingle
+            min_words: Texts with fewer words are always kept
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_words = min_words
+        self.hasher = MinHasher(num_perm, shingle_words)
+        self._namespaces = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _namespace(self, name):
+        if name not in self._namespaces:
+            self._namespaces[name] = {"buckets": [{} for _ in range(self.bands)], "entries": {}}
+            self._stats[name] = {"checked": 0, "duplicates": 0, "words_checked": 0, "words_dropped": 0}
+        return self._namespaces[name]
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def check(self, text, key=None, namespace="default", keep_text=False):
+        """Look for an earlier near-duplicate of text, registering text if there is none
+
+        Args:
+            text: The text to check
+            key: Identifier of the text (e.g. its URL). Checking a text again
+                under the key it was registered with doesn't count as a duplicate.
+            namespace: Group of texts to compare against
+            keep_text: Whether to keep the text so canonical() can return it
+
+        Returns:
+            The key of the earlier near-duplicate, or None if the text is new
+        """
+        words = _WORD.findall(text.lower())
+        if len(words) < self.min_words:
+            return None
+        signature = self.hasher.signature(words)
+        band_keys = self._band_keys(signature)
+
+        with self._lock:
+            space = self._namespace(namespace)
+            stats = self._stats[namespace]
+            stats["checked"] += 1
+            stats["words_checked"] += len(words)
+
+            candidates = set()
+            for band, band_key in enumerate(band_keys):
+                candidates.update(space["buckets"][band].get(band_key, ()))
+            for candidate in candidates:
+                if candidate == key:
+                    continue
+                similarity = float(np.mean(space["entries"][candidate]["signature"] == signature))
+                if similarity >= self.threshold:
+                    stats["duplicates"] += 1
+                    stats["words_dropped"] += len(words)
+                    return candidate
+
+            key = key if key is not None else f"{namespace}:{len(space['entries'])}"
+            if key not in space["entries"]:
+                for band, band_key in enumerate(band_keys):
+                    space["buckets"][band].setdefault(band_key, []).append(key)
+            space["entries"][key] = {"signature": signature, "text": text if keep_text else None}
+            return None
+
+    def canonical(self, text, namespace="default"):
+        """Return the first-seen text this text nearly duplicates, or the text itself
+
+        Mapping near-duplicates onto one representative lets exact-match caches
+        (summaries, embeddings) serve them.
+        """
+        duplicate_of = self.check(text, namespace=namespace, keep_text=True)
+        if duplicate_of is None:
+            return text
+        with self._lock:
+            return self._namespaces[namespace]["entries"][duplicate_of]["text"] or text
+
+    def filter(self, items, text=lambda item: item, namespace="default"):
+        """Drop the items whose text nearly duplicates an earlier one"""
+        return [item for item in items if self.check(text(item), namespace=namespace) is None]
+
+    def stats(self):
+        """Texts checked and dropped per namespace, with the share of duplicates"""
+        with self._lock:
+            stats = {name: dict(entry) for name, entry in self._stats.items()}
+        for entry in stats.values():
+            entry["dedup_ratio"] = entry["duplicates"] / entry["checked"] if entry["checked"] else 0.0
+        return stats
+
+
+@contextmanager
+def use_dedup_index(index):
+    """Make `index` the near-duplicate index for the current context (one research session)"""
+    token = _current_index.set(index)
+    try:
+        yield index
+    finally:
+        _current_index.reset(token)
+
+
+def get_dedup_index():
+    """The current session's near-duplicate index, or None when deduplication is off"""
+    return _current_index.get()
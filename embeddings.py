@@ -0,0 +1,368 @@
+from collections import OrderedDict
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.embeddings.openai import OpenAIEmbedding
+from pydantic import PrivateAttr
+from contextlib import contextmanager
+from config import (
+    EMBEDDING_MODEL, EMBED_BATCH_SIZE, OPENAI_BASE_URL, EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_MEMORY_ENTRIES
+)
+import numpy as np
+import threading
+import hashlib
+import sqlite3
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+def embedding_key(model, text, kind="text"):
+    """Content-addressed cache key for an embedding of `text` produced by `model`"""
+    digest = hashlib.sha256()
+    for part in (model, kind, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """Persistent embedding cache backed by SQLite and a memory-mapped float32 matrix
+
+    SQLite maps each key to a row of the matrix; the vectors themselves live in
+    a flat memory-mapped file so lookups don't deserialize anything. A small
+    in-memory LRU tier sits in front of the disk store. When the store holds
+    more than `max_entries` vectors, the least recently used ones are evicted
+    and their rows are reused.
+
+    Several processes can share a store. Rows are allocated, and the vector
+    file grown, under an exclusive lock on a sidecar file; lookups hold it
+    shared so a row can't be reused while it is being read. Whoever takes
+    the lock first picks up rows allocated and file growth done by others.
+    """
+
+    def __init__(self, cache_dir, max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                 memory_entries=EMBEDDING_CACHE_MEMORY_ENTRIES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.matrix_path = os.path.join(cache_dir, "vectors.f32")
+        self.lock_path = os.path.join(cache_dir, "vectors.lock")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()
+        self._matrix = None
+        self._capacity = 0
+        self._free_rows = []
+        self._data_version = None
+
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self._db.commit()
+
+        self.dim = None
+        with self._locked(shared=True):
+            self._sync()
+
+    @contextmanager
+    def _locked(self, shared=False):
+        """Hold the store's lock, shared with other processes, for the duration of the block"""
+        with self._lock:
+            with open(self.lock_path, "a+b") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Pick up rows allocated, and vector file growth, by other processes
+
+        Call with the lock held. SQLite's data_version only changes when another
+        connection commits, so a store used by one process never rescans.
+        """
+        (version,) = self._db.execute("PRAGMA data_version").fetchone()
+        if self.dim is None:
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            self.dim = row[0] if row else None
+        if self.dim is None or not os.path.exists(self.matrix_path):
+            self._data_version = version
+            return
+        size = os.path.getsize(self.matrix_path)
+        if version != self._data_version or size != self._capacity * self.dim * 4:
+            self._open_matrix()
+            self._data_version = version
+
+    def _open_matrix(self):
+        """Memory-map the vector file and work out which rows are free"""
+        size = os.path.getsize(self.matrix_path)
+        self._capacity = size // (self.dim * 4)
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+",
+                                 shape=(self._capacity, self.dim)) if self._capacity else None
+        used = {row for (row,) in self._db.execute("SELECT row FROM entries")}
+        self._free_rows = [row for row in range(self._capacity - 1, -1, -1) if row not in used]
+
+    def _grow(self, needed):
+        """Extend the vector file so at least `needed` more rows are free"""
+        new_capacity = max(self._capacity * 2, self._capacity + needed, 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._free_rows = list(range(new_capacity - 1, self._capacity - 1, -1)) + self._free_rows
+        self._capacity = new_capacity
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+",
+                                 shape=(self._capacity, self.dim))
+
+    def _remember(self, key, vector):
+        # Kept as float32 arrays; a list of Python floats takes about 8x the memory
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """Look up several keys at once
+
+        Returns:
+            A dict mapping each cached key to its embedding (as a list of floats)
+        """
+        found = {}
+        with self._lock:
+            pending = []
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key].tolist()
+                elif key not in pending:
+                    pending.append(key)
+
+            if pending:
+                self._read_rows(pending, found)
+
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def _read_rows(self, pending, found):
+        """Copy the vectors of keys stored on disk into `found`"""
+        with self._locked(shared=True):
+            self._sync()
+            if self._matrix is not None:
+                now = time.time()
+                for start in range(0, len(pending), 500):
+                    chunk = pending[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = self._db.execute(
+                        f"SELECT key, row FROM entries WHERE key IN ({placeholders})", chunk
+                    ).fetchall()
+                    for key, row in rows:
+                        # Copied out of the map, since evicted rows are reused for other keys
+                        vector = np.array(self._matrix[row])
+                        found[key] = vector.tolist()
+                        self._remember(key, vector)
+                    if rows:
+                        self._db.executemany(
+                            "UPDATE entries SET last_used = ? WHERE key = ?",
+                            [(now, key) for key, _ in rows]
+                        )
+                self._db.commit()
+
+    def put_many(self, items):
+        """Store several (key, embedding) pairs"""
+        items = [(key, vector) for key, vector in items if vector is not None]
+        if not items:
+            return
+
+        with self._locked():
+            self._sync()
+            if self.dim is None:
+                self.dim = len(items[0][1])
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (self.dim,))
+
+            existing = {}
+            keys = [key for key, _ in items]
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(self._db.execute(
+                    f"SELECT key, row FROM entries WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+
+            new_keys = {key for key in keys if key not in existing}
+            if len(new_keys) > len(self._free_rows):
+                self._grow(len(new_keys) - len(self._free_rows))
+
+            now = time.time()
+            records = []
+            for key, vector in items:
+                if len(vector) != self.dim:
+                    continue
+                row = existing.get(key)
+                if row is None:
+                    row = self._free_rows.pop()
+                    existing[key] = row
+                vector = np.array(vector, dtype=np.float32)
+                self._matrix[row] = vector
+                records.append((key, row, now))
+                self._remember(key, vector)
+
+            self._matrix.flush()
+            self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", records)
+            self._db.commit()
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries once the store exceeds its size limit"""
+        (count,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+
+        # Evict down to 90% of the limit so we don't evict on every insert
+        excess += self.max_entries // 10
+        victims = self._db.execute(
+            "SELECT key, row FROM entries ORDER BY last_used ASC LIMIT ?", (excess,)
+        ).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+        self._db.commit()
+        for key, row in victims:
+            self._memory.pop(key, None)
+            self._free_rows.append(row)
+        self.evictions += len(victims)
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache"""
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": count,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._db.close()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that serves repeated chunks from an EmbeddingStore
+
+    Only texts missing from the cache are sent to the wrapped model, so
+    re-indexing identical pages or reports costs no embedding calls.
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _store: EmbeddingStore = PrivateAttr()
+
+    def __init__(self, inner, store, **kwargs):
+        kwargs.setdefault("model_name", inner.model_name)
+        kwargs.setdefault("embed_batch_size", inner.embed_batch_size)
+        super().__init__(**kwargs)
+        self._inner = inner
+        self._store = store
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    @property
+    def store(self):
+        return self._store
+
+    def _lookup(self, texts, kind):
+        """Split texts into cached embeddings and the unique texts still to embed"""
+        keys = [embedding_key(self.model_name, text, kind) for text in texts]
+        found = self._store.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        return keys, found, missing
+
+    def _store_computed(self, found, missing, vectors):
+        new_items = list(zip(missing.keys(), vectors))
+        self._store.put_many(new_items)
+        found.update(new_items)
+
+    def _embed(self, texts, kind, compute):
+        keys, found, missing = self._lookup(texts, kind)
+        if missing:
+            self._store_computed(found, missing, compute(list(missing.values())))
+        return [found[key] for key in keys]
+
+    async def _aembed(self, texts, kind, compute):
+        keys, found, missing = self._lookup(texts, kind)
+        if missing:
+            self._store_computed(found, missing, await compute(list(missing.values())))
+        return [found[key] for key in keys]
+
+    def _get_query_embedding(self, query):
+        return self._embed([query], "query",
+                           lambda texts: [self._inner.get_query_embedding(texts[0])])[0]
+
+    async def _aget_query_embedding(self, query):
+        async def compute(texts):
+            return [await self._inner.aget_query_embedding(texts[0])]
+        return (await self._aembed([query], "query", compute))[0]
+
+    def _get_text_embedding(self, text):
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text):
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts):
+        return self._embed(texts, "text", self._inner.get_text_embedding_batch)
+
+    async def _aget_text_embeddings(self, texts):
+        return await self._aembed(texts, "text", self._inner.aget_text_embedding_batch)
+
+
+# One store per embedding model, shared by every index in the process
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(model=EMBEDDING_MODEL):
+    """Get the process-wide embedding store for a model"""
+    with _stores_lock:
+        if model not in _stores:
+            safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in model)
+            _stores[model] = EmbeddingStore(os.path.join(EMBEDDING_CACHE_DIR, safe_name))
+        return _stores[model]
+
+
+def get_embed_model(model=EMBEDDING_MODEL, use_cache=True):
+    """Get an OpenAI embedding model, optionally wrapped in the persistent cache"""
+    options = {"api_base": OPENAI_BASE_URL} if OPENAI_BASE_URL else {}
+    embed_model = OpenAIEmbedding(model=model, embed_batch_size=EMBED_BATCH_SIZE, **options)
+    if not use_cache:
+        return embed_model
+    return CachedEmbedding(embed_model, get_embedding_store(model))
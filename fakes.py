@@ -0,0 +1,273 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+from array import array
+import threading
+import hashlib
+import base64
+import random
+import json
+import time
+import zlib
+
+DEFAULT_LATENCY = {"llm": 0.0, "embedding": 0.0, "search": 0.0, "page": 0.0}
+
+WORDS = (
+    "research analysis data model system network energy market policy climate "
+    "learning quantum protein battery signal vector index source report growth "
+    "study method result trend evidence review survey theory impact design"
+).split()
+
+
+def lorem(words, seed=0):
+    """Deterministic filler text of roughly `words` words"""
+    rng = random.Random(seed)
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        remaining -= length
+    return " ".join(sentences)
+
+
+def fake_embedding(text, dim):
+    """Deterministic unit-length pseudo-embedding derived from the text hash"""
+    seed = int.from_bytes(hashlib.sha256(str(text).encode("utf-8")).digest()[:8], "little")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeServer:
+    """Threaded local HTTP server faking the OpenAI, Tavily and web page APIs
+
+    It speaks just enough of each API for the real clients to work against
+    it: point OPENAI_BASE_URL at `openai_base_url` and TAVILY_API_URL at
+    `url`. Every route has a configurable latency (in seconds) so benchmarks
+    can model slow upstream services without touching the network.
+
+    Routes:
+        POST /v1/chat/completions  OpenAI-compatible chat (streaming supported)
+        POST /v1/embeddings        OpenAI-compatible embeddings
+        POST /search               Tavily-compatible search
+        GET  /pages/<n>            HTML article pages with ETag support
+    """
+
+    def __init__(self, latency=None, embedding_dim=256, page_words=1500, answer_words=200,
+                 host="127.0.0.1", port=0):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.embedding_dim = embedding_dim
+        self.page_words = page_words
+        self.answer_words = answer_words
+        self.counts = {"llm": 0, "embedding": 0, "search": 0, "page": 0}
+        self._counts_lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                path = urlsplit(self.path).path
+                if path.endswith("/chat/completions"):
+                    server._chat(self, body)
+                elif path.endswith("/embeddings"):
+                    server._embeddings(self, body)
+                elif path.endswith("/search"):
+                    server._search(self, body)
+                else:
+                    self.send_error(404)
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path.startswith("/pages/"):
+                    server._page(self, path.rsplit("/", 1)[-1])
+                else:
+                    self.send_error(404)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.openai_base_url = f"{self.url}/v1"
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _hit(self, route):
+        with self._counts_lock:
+            self.counts[route] += 1
+        if self.latency[route]:
+            time.sleep(self.latency[route])
+
+    @staticmethod
+    def _send_json(handler, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _chat(self, handler, body):
+        self._hit("llm")
+        prompt = json.dumps(body.get("messages", []))
+        answer = "Thought: I now know the final answer\nFinal Answer: " + lorem(self.answer_words, seed=len(prompt))
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(answer) // 4
+        model = body.get("model", "fake-model")
+
+        if body.get("stream"):
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream")
+            handler.end_headers()
+            for start in range(0, len(answer), 40):
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": answer[start:start + 40]}, "finish_reason": None}],
+                }
+                handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            done = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            handler.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            return
+
+        self._send_json(handler, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _embeddings(self, handler, body):
+        self._hit("embedding")
+        inputs = body.get("input", [])
+        if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        def encode(vector):
+            # The OpenAI client asks for base64-packed float32 by default
+            if body.get("encoding_format") == "base64":
+                return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+            return vector
+
+        self._send_json(handler, {
+            "object": "list",
+            "model": body.get("model", "fake-embedding"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": encode(fake_embedding(text, self.embedding_dim))}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def _search(self, handler, body):
+        self._hit("search")
+        query = body.get("query", "")
+        seed = int(hashlib.sha256(query.encode("utf-8")).hexdigest()[:6], 16)
+        self._send_json(handler, {
+            "query": query,
+            "results": [
+                {
+                    "title": f"Result {i} for {query}",
+                    "url": f"{self.url}/pages/{seed + i}",
+                    "content": lorem(60, seed=seed + i),
+                    "score": 1.0 - i / 10,
+                }
+                for i in range(body.get("max_results", 5))
+            ],
+        })
+
+    def _page(self, handler, page_id):
+        etag = f'"{page_id}"'
+        if handler.headers.get("If-None-Match") == etag:
+            self._hit("page")
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.end_headers()
+            return
+
+        self._hit("page")
+        paragraphs = "".join(
+            f"<p>{lorem(100, seed=zlib.crc32(f'{page_id}:{i}'.encode('utf-8')))}</p>"
+            for i in range(max(1, self.page_words // 100))
+        )
+        html = (
+            f"<html><head><title>Page {page_id}</title><script>var x = 1;</script></head>"
+            f"<body><nav>Home | About | Contact</nav><article><h1>Article {page_id}</h1>{paragraphs}</article>"
+            f"<footer>Copyright</footer></body></html>"
+        ).encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/html; charset=utf-8")
+        handler.send_header("Content-Length", str(len(html)))
+        handler.send_header("ETag", etag)
+        handler.end_headers()
+        handler.wfile.write(html)
+
+
+def make_text_pdf(path, pages, words_per_page=400):
+    """Write a simple multi-page PDF containing filler text"""
+    objects = []
+
+    def add(obj):
+        objects.append(obj)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1 + 2 * pages
+    page_ids = []
+    for number in range(pages):
+        words = lorem(words_per_page, seed=number).split()
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        stream = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(
+            "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") '" for line in lines
+        ) + " ET"
+        stream = stream.encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content, font)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages)
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, obj in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + obj + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, catalog, xref))
+    return path
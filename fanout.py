@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from llm import get_llm
+from tracing import bind_context, trace_span
+from config import FAN_OUT_SUBQUESTIONS, FAN_OUT_CONCURRENCY
+import re
+
+PLAN_PROMPT = """Split the following research topic into {count} distinct sub-questions that together cover it.
+Each sub-question should be answerable on its own by searching the web, and they should overlap as little as possible.
+
+Topic: {topic}
+
+Answer with one sub-question per line and nothing else."""
+
+URL_PATTERN = re.compile(r"https?://[^\s)\]>\"']+")
+
+
+def plan_subquestions(topic, count, llm=None):
+    """Split a topic into at most `count` sub-questions
+
+    Falls back to researching the topic as a whole if planning fails.
+    """
+    llm = llm or get_llm(temperature=0)
+    try:
+        answer = llm.invoke(PLAN_PROMPT.format(topic=topic, count=count)).content
+    except Exception as e:
+        print(f"Error planning sub-questions: {str(e)}")
+        return [topic]
+
+    questions, seen = [], set()
+    for line in answer.splitlines():
+        # Drop list markers such as "1.", "2)" or "-"
+        question = re.sub(r"^\s*(?:\d+[.)]|[-*•])\s*", "", line).strip()
+        if question and question.lower() not in seen:
+            seen.add(question.lower())
+            questions.append(question)
+    return questions[:count] or [topic]
+
+
+def _normalize(block):
+    """Reduce a block of findings to the text that identifies it as a duplicate"""
+    return " ".join(re.sub(r"[^\w\s:/.]", " ", block.lower()).split())
+
+
+def merge_findings(findings):
+    """Merge the findings of several sub-questions, dropping repeated blocks
+
+    Paragraphs and list items that already appeared under an earlier
+    sub-question are dropped, and every cited URL is listed once at the end.
+
+    Args:
+        findings: (sub-question, findings text) pairs, in plan order
+
+    Returns:
+        A dict with the merged Markdown, the number of blocks kept and the
+        number of duplicate blocks dropped
+    """
+    seen, sources = set(), {}
+    sections, kept, dropped = [], 0, 0
+    for question, text in findings:
+        blocks = []
+        for block in re.split(r"\n\s*\n|\n(?=\s*(?:[-*]|\d+\.)\s)", text):
+            key = _normalize(block)
+            if not key:
+                continue
+            if key in seen:
+                dropped += 1
+                continue
+            seen.add(key)
+            blocks.append(block.strip())
+            for url in URL_PATTERN.findall(block):
+                sources.setdefault(url.rstrip(".,;:"), None)
+        kept += len(blocks)
+        if blocks:
+            sections.append(f"## {question}\n\n" + "\n\n".join(blocks))
+
+    if sources:
+        sections.append("## Sources\n\n" + "\n".join(f"- {url}" for url in sources))
+    return {"findings": "\n\n".join(sections), "blocks": kept, "duplicates_dropped": dropped}
+
+
+def run_fan_out(topic, create_crew, subquestions=FAN_OUT_SUBQUESTIONS, concurrency=FAN_OUT_CONCURRENCY, llm=None):
+    """Research a topic as concurrent sub-questions and merge their findings
+
+    Each sub-question gets its own single-researcher crew, at most
+    `concurrency` at a time, so with enough slots the research stage takes
+    about as long as its slowest sub-question. A failed sub-question is
+    reported and left out of the findings.
+
+    Args:
+        topic: The topic to research
+        create_crew: Callable building the crew for one sub-question
+        subquestions: Number of sub-questions to split the topic into
+        concurrency: Maximum number of sub-question crews running at once
+        llm: Chat model used for planning. Defaults to the configured model at temperature 0.
+
+    Returns:
+        The merge_findings() dict, plus the sub-questions and how many of them failed
+
+    Raises:
+        RuntimeError: If every sub-question failed
+    """
+    with trace_span("research.plan", "crew", subquestions=subquestions) as span:
+        questions = plan_subquestions(topic, subquestions, llm)
+        span.set(planned=len(questions))
+
+    def research(question):
+        with trace_span("research.subquestion", "crew", question=question[:80]):
+            try:
+                return str(create_crew(question).kickoff())
+            except Exception as e:
+                print(f"Error researching '{question}': {str(e)}")
+                return None
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="research-fan-out") as pool:
+        outputs = list(pool.map(bind_context(research), questions))
+
+    findings = [(question, output) for question, output in zip(questions, outputs) if output]
+    if not findings:
+        raise RuntimeError(f"Research failed for all {len(questions)} sub-questions")
+    return {
+        **merge_findings(findings),
+        "subquestions": questions,
+        "failed": len(questions) - len(findings)
+    }
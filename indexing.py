@@ -1,53 +1,101 @@
 from llama_index.core import VectorStoreIndex, Document, Settings
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.core import StorageContext
-from langchain_openai import OpenAIEmbeddings
-from config import EMBEDDING_MODEL, OUTPUT_DIR
+from llama_index.core.schema import QueryBundle
+from llama_index.core.vector_stores import MetadataFilters, MetadataFilter, FilterOperator
+from config import EMBEDDING_MODEL, OUTPUT_DIR, INDEX_BATCH_SIZE, VECTOR_BACKEND
+from embeddings import get_embed_model
+from metadata_store import MetadataLog
+from tracing import trace_span
+from dedup import get_dedup_index
 import os
-import chromadb
+import threading
+import hashlib
+import math
 import uuid
-import json
+from datetime import datetime
+
+
+def content_hash(content, scope=None):
+    """Return a stable hash of document content, used for deduplication
+    
+    Content added under a scope (e.g. a research topic) hashes differently in
+    every scope, so each scope keeps its own copy with its own metadata.
+    """
+    if scope is not None:
+        content = f"{scope}\0{content}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
 
 class ResearchIndex:
-    def __init__(self, persist_dir=None):
+    def __init__(self, persist_dir=None, use_embedding_cache=True, vector_backend=None):
         """Initialize the research index
         
         Args:
             persist_dir: Directory to persist the index. If None, the index will be in-memory only.
+            use_embedding_cache: Whether to serve repeated chunks from the persistent embedding cache
+            vector_backend: "chroma" or "faiss"; defaults to the VECTOR_BACKEND setting
         """
         # Set up the embedding model
-        embed_model = OpenAIEmbedding(model=EMBEDDING_MODEL)
+        embed_model = get_embed_model(EMBEDDING_MODEL, use_cache=use_embedding_cache)
         Settings.embed_model = embed_model
+        self.embed_model = embed_model
         Settings.node_parser = SentenceSplitter(chunk_size=1024)
         
         self.documents = []
         self.index = None
+        self.chroma_client = None
+        self.chroma_collection = None
+        self.vector_store = None
+        self.storage_context = None
+        self.metadata_log = None
+        # Content hash -> ID of the document holding that content
+        self._content_hashes = {}
+        self._retrievers = {}
+        self._query_engines = {}
+        # Writers (e.g. concurrent research jobs sharing this index) take turns
+        self._lock = threading.RLock()
+        self.vector_backend = vector_backend or VECTOR_BACKEND
         self.persist_dir = persist_dir if persist_dir else os.path.join(OUTPUT_DIR, "vector_index")
+        # Near-duplicates are detected per index, within the current research session
+        self.dedup_namespace = f"index:{os.path.basename(os.path.normpath(self.persist_dir))}"
         
         # Create persistent storage if specified
         if self.persist_dir:
             os.makedirs(self.persist_dir, exist_ok=True)
             self._setup_persistent_index()
+            if self.persist_dir:
+                self.metadata_log = MetadataLog(self.persist_dir)
         else:
             # Create an empty index
             self.index = None
         
     def _setup_persistent_index(self):
-        """Set up a persistent index using ChromaDB"""
+        """Set up a persistent index using ChromaDB or FAISS"""
         try:
-            # Create client and collection
-            chroma_client = chromadb.PersistentClient(self.persist_dir)
-            chroma_collection = chroma_client.get_or_create_collection("research_data")
+            if self.vector_backend == "faiss":
+                from vector_store import FaissVectorStore
+                self.vector_store = FaissVectorStore(os.path.join(self.persist_dir, "faiss"))
+                stored_count = self.vector_store.count()
+            elif self.vector_backend == "chroma":
+                import chromadb
+                from llama_index.vector_stores.chroma import ChromaVectorStore
+                
+                # Create the client and collection once; they live as long as the index
+                self.chroma_client = chromadb.PersistentClient(self.persist_dir)
+                self.chroma_collection = self.chroma_client.get_or_create_collection("research_data")
+                self.vector_store = ChromaVectorStore(chroma_collection=self.chroma_collection)
+                stored_count = self.chroma_collection.count()
+            else:
+                raise ValueError(f"Unknown vector backend: {self.vector_backend}")
             
-            # Create vector store and storage context
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-            storage_context = StorageContext.from_defaults(vector_store=vector_store)
+            # Create storage context
+            self.storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
             
             # Load or create index
-            if chroma_collection.count() > 0:
-                self.index = VectorStoreIndex.from_vector_store(vector_store)
+            if stored_count > 0:
+                self.index = VectorStoreIndex.from_vector_store(self.vector_store)
+                self._load_content_hashes()
             else:
                 self.index = None
                 
@@ -55,96 +103,344 @@ class ResearchIndex:
             print(f"Error setting up persistent index: {str(e)}")
             print("Falling back to in-memory index")
             self.index = None
+            self.chroma_client = None
+            self.chroma_collection = None
+            self.vector_store = None
+            self.storage_context = None
             self.persist_dir = None
+
+    def _load_content_hashes(self):
+        """Collect the content hashes of documents already stored in the vector store"""
+        try:
+            if self.chroma_collection is None:
+                # Document IDs are content hashes, and the FAISS id map indexes them
+                self._content_hashes.update(self.vector_store.doc_ids())
+                return
+            stored = self.chroma_collection.get(include=["metadatas"])
+            for node_metadata in stored.get("metadatas") or []:
+                if node_metadata and node_metadata.get("content_hash"):
+                    self._content_hashes[node_metadata["content_hash"]] = node_metadata.get("id")
+        except Exception as e:
+            print(f"Error loading stored content hashes: {str(e)}")
     
     def add_document(self, content, metadata=None):
-        """Add a document to the index"""
-        if metadata is None:
-            metadata = {}
+        """Add a document to the index
         
-        # Add timestamp and unique ID if not provided
-        if "timestamp" not in metadata:
-            from datetime import datetime
-            metadata["timestamp"] = datetime.now().isoformat()
-        
-        if "id" not in metadata:
-            metadata["id"] = str(uuid.uuid4())
-        
-        # Create document
-        doc = Document(text=content, metadata=metadata)
-        self.documents.append(doc)
-        
-        # Rebuild index when new documents are added
-        self._build_index()
+        Returns:
+            The document ID, or None if identical content was already indexed
+        """
+        ids = self.add_documents([{"content": content, "metadata": metadata}])
+        return ids[0] if ids else None
+
+    def contains(self, content, scope=None):
+        """Whether identical content is already indexed (under the same scope)"""
+        with self._lock:
+            return content_hash(content, scope) in self._content_hashes
+
+    def add_documents(self, batch, batch_size=INDEX_BATCH_SIZE):
+        """Add several documents to the index, embedding only new content
         
-        # Save metadata separately for easy access
-        if self.persist_dir:
-            metadata_path = os.path.join(self.persist_dir, "metadata.json")
-            try:
-                # Load existing metadata if available
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r') as f:
-                        all_metadata = json.load(f)
-                else:
-                    all_metadata = []
+        Args:
+            batch: Iterable of dicts with a "content" key and optional "metadata" and
+                "scope" keys. Content is only deduplicated against documents
+                added under the same scope. Generators are consumed lazily, one
+                batch at a time.
+            batch_size: Number of documents chunked, embedded and inserted at a time
+            
+        Returns:
+            The IDs of the documents that were added. Documents whose content is
+            already indexed (or repeated within the batch) are skipped, as are
+            near-duplicates of documents added earlier in the session. Skipping
+            already indexed content records when it was last seen, so a page
+            fetched again counts as fresh.
+        """
+        dedup = get_dedup_index()
+        with self._lock:
+            added_ids = []
+            pending = []
+            for item in batch:
+                content = item["content"]
+                metadata = dict(item.get("metadata") or {})
                 
-                # Add new metadata
-                all_metadata.append(metadata)
+                digest = content_hash(content, item.get("scope"))
+                if digest in self._content_hashes:
+                    self._touch(self._content_hashes[digest])
+                    continue
+                if dedup is not None and dedup.check(content, key=digest, namespace=self.dedup_namespace):
+                    continue
                 
-                # Save updated metadata
-                with open(metadata_path, 'w') as f:
-                    json.dump(all_metadata, f, indent=2)
-            except Exception as e:
-                print(f"Error saving metadata: {str(e)}")
-        
-    def _build_index(self):
-        """Build the vector index from added documents"""
-        if not self.documents:
-            return
+                # Add timestamp and unique ID if not provided
+                if "timestamp" not in metadata:
+                    metadata["timestamp"] = datetime.now().isoformat()
+                
+                if "id" not in metadata:
+                    metadata["id"] = str(uuid.uuid4())
+                metadata["content_hash"] = digest
+                self._content_hashes[digest] = metadata["id"]
+                
+                # The content hash doubles as the document ID so re-inserts are idempotent
+                pending.append(Document(
+                    text=content,
+                    metadata=metadata,
+                    id_=digest,
+                    excluded_embed_metadata_keys=["content_hash"],
+                    excluded_llm_metadata_keys=["content_hash"]
+                ))
+                if len(pending) >= batch_size:
+                    added_ids.extend(self._flush_documents(pending))
+                    pending = []
+            
+            if pending:
+                added_ids.extend(self._flush_documents(pending))
+        return added_ids
+
+    def _flush_documents(self, docs):
+        """Index a batch of new documents and record their metadata"""
+        with trace_span("index.insert", "index", documents=len(docs)):
+            inserted = self._insert_documents(docs)
+        if not inserted:
+            # Let a later call retry the documents that failed to index
+            for doc in docs:
+                self._content_hashes.pop(doc.metadata["content_hash"], None)
+            return []
         
+        self.documents.extend(docs)
+        self._save_metadata(docs)
+        return [doc.metadata["id"] for doc in docs]
+
+    def _insert_documents(self, docs):
+        """Chunk, embed and insert a batch of new documents into the vector index"""
         try:
-            if self.persist_dir:
-                # Get the storage context from the existing setup
-                chroma_client = chromadb.PersistentClient(self.persist_dir)
-                chroma_collection = chroma_client.get_or_create_collection("research_data")
-                vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-                storage_context = StorageContext.from_defaults(vector_store=vector_store)
-                
-                # Create or update the index
-                if self.index is None:
-                    self.index = VectorStoreIndex.from_documents(
-                        self.documents,
-                        storage_context=storage_context
-                    )
+            nodes = Settings.node_parser.get_nodes_from_documents(docs)
+            dedup = get_dedup_index()
+            if dedup is not None:
+                # Boilerplate and quoted passages shared between documents are embedded once
+                nodes = dedup.filter(nodes, text=lambda node: node.get_content(),
+                                     namespace=f"{self.dedup_namespace}:chunks")
+                if not nodes:
+                    return True
+            if self.index is None:
+                # Retrievers and query engines are bound to the old (empty) index
+                self._retrievers.clear()
+                self._query_engines.clear()
+                if self.storage_context is not None:
+                    self.index = VectorStoreIndex(nodes, storage_context=self.storage_context)
                 else:
-                    # Add only new documents
-                    for doc in self.documents:
-                        self.index.insert(doc)
+                    self.index = VectorStoreIndex(nodes)
             else:
-                # In-memory index
-                self.index = VectorStoreIndex.from_documents(self.documents)
+                self.index.insert_nodes(nodes)
+            return True
         except Exception as e:
             print(f"Error building index: {str(e)}")
+            return False
+
+    def _touch(self, doc_id):
+        """Record that an already indexed document's content was seen again"""
+        if doc_id is None:
+            return
+        now = datetime.now().isoformat()
+        if not self.metadata_log:
+            for doc in self.documents:
+                if doc.metadata.get("id") == doc_id:
+                    doc.metadata["last_seen"] = now
+            return
+        
+        try:
+            record = self.metadata_log.get(doc_id)
+            if record is not None:
+                record["metadata"]["last_seen"] = now
+                self.metadata_log.append(doc_id, record["metadata"], record.get("preview"))
+        except Exception as e:
+            print(f"Error saving metadata: {str(e)}")
+
+    def _save_metadata(self, docs):
+        """Save metadata separately for easy access"""
+        if not self.metadata_log:
+            return
+        
+        try:
+            self.metadata_log.append_many([
+                {"id": doc.metadata["id"], "metadata": doc.metadata, "preview": self._preview(doc.text)}
+                for doc in docs
+            ])
+        except Exception as e:
+            print(f"Error saving metadata: {str(e)}")
+
+    def save(self):
+        """Snapshot the vector index and metadata offsets so the next open is fast"""
+        with self._lock:
+            if self.vector_backend == "faiss" and self.vector_store is not None:
+                self.vector_store.save()
+            if self.metadata_log:
+                self.metadata_log.save_index()
+
+    @staticmethod
+    def _preview(text):
+        return text[:200] + "..." if len(text) > 200 else text
     
-    def query(self, query_text, similarity_top_k=3):
-        """Query the index for relevant information"""
+    def query(self, query_text, similarity_top_k=3, synthesize=True):
+        """Query the index for relevant information
+        
+        Args:
+            query_text: The question to answer
+            similarity_top_k: Number of chunks to retrieve
+            synthesize: Whether to have the LLM write an answer from the chunks.
+                If False, the retrieved chunks are returned as-is, with no LLM call.
+        """
         if not self.index:
             return "No documents have been indexed yet."
         
-        try:    
-            query_engine = self.index.as_query_engine(similarity_top_k=similarity_top_k)
-            response = query_engine.query(query_text)
+        if not synthesize:
+            results = self.retrieve(query_text, similarity_top_k=similarity_top_k)
+            return "\n\n".join(f"[score {result['score']:.2f}] {result['text']}" for result in results)
+        
+        try:
+            with trace_span("index.query", "index"):
+                if similarity_top_k not in self._query_engines:
+                    self._query_engines[similarity_top_k] = self.index.as_query_engine(
+                        similarity_top_k=similarity_top_k
+                    )
+                response = self._query_engines[similarity_top_k].query(query_text)
             return str(response)
         except Exception as e:
             return f"Error querying index: {str(e)}"
+
+    def _get_retriever(self, similarity_top_k, filters):
+        """Get a cached retriever for a result count and set of exact-match filters"""
+        key = (similarity_top_k, tuple(sorted(filters.items())))
+        if key not in self._retrievers:
+            metadata_filters = MetadataFilters(filters=[
+                MetadataFilter(key=name, value=value, operator=FilterOperator.EQ)
+                for name, value in sorted(filters.items())
+            ]) if filters else None
+            self._retrievers[key] = self.index.as_retriever(
+                similarity_top_k=similarity_top_k,
+                filters=metadata_filters
+            )
+        return self._retrievers[key]
+
+    @staticmethod
+    def _in_time_range(metadata, since, until):
+        timestamp = metadata.get("timestamp")
+        if not timestamp:
+            return since is None and until is None
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            return False
+        return (since is None or timestamp >= since) and (until is None or timestamp <= until)
+
+    def retrieve(self, query_text, similarity_top_k=3, **kwargs):
+        """Retrieve the chunks most relevant to a query, without LLM synthesis
+        
+        Accepts the same filters as retrieve_many.
+        """
+        return self.retrieve_many([query_text], similarity_top_k=similarity_top_k, **kwargs)[0]
+
+    def retrieve_many(self, queries, similarity_top_k=3, topic=None, doc_type=None,
+                      since=None, until=None, **filters):
+        """Retrieve relevant chunks for several queries at once
+        
+        All query embeddings are computed in a single batch, then each query is
+        run against a cached retriever.
+        
+        Args:
+            queries: List of query strings
+            similarity_top_k: Number of chunks to return per query
+            topic: Only return chunks from documents with this topic
+            doc_type: Only return chunks from documents of this type (e.g. "report", "source")
+            since: Only return chunks indexed at or after this datetime (or ISO string)
+            until: Only return chunks indexed at or before this datetime (or ISO string)
+            **filters: Other exact-match metadata filters
+            
+        Returns:
+            One list per query of dicts with "text", "score", "metadata" and "node_id"
+            keys. Scores are cosine similarities whichever vector backend is used.
+        """
+        queries = list(queries)
+        if not self.index or not queries:
+            return [[] for _ in queries]
+        
+        if topic is not None:
+            filters["topic"] = topic
+        if doc_type is not None:
+            filters["type"] = doc_type
+        if isinstance(since, str):
+            since = datetime.fromisoformat(since)
+        if isinstance(until, str):
+            until = datetime.fromisoformat(until)
+        
+        # Timestamps are ISO strings, which vector stores can't range-filter,
+        # so over-fetch and filter them here
+        time_filtered = since is not None or until is not None
+        fetch_k = similarity_top_k * 3 if time_filtered else similarity_top_k
+        
+        with trace_span("index.retrieve", "index", queries=len(queries)):
+            # OpenAI embeds queries and documents the same way, so one batch call covers all queries
+            embeddings = self.embed_model.get_text_embedding_batch(queries)
+            retriever = self._get_retriever(fetch_k, filters)
+            
+            all_results = []
+            for query_text, embedding in zip(queries, embeddings):
+                nodes = retriever.retrieve(QueryBundle(query_str=query_text, embedding=embedding))
+                results = []
+                for node in nodes:
+                    if time_filtered and not self._in_time_range(node.metadata, since, until):
+                        continue
+                    results.append({
+                        "text": node.get_content(),
+                        "score": self._cosine_similarity(node.score),
+                        "metadata": dict(node.metadata),
+                        "node_id": node.node_id
+                    })
+                all_results.append(results[:similarity_top_k])
+        return all_results
+    
+    def _cosine_similarity(self, score):
+        """Convert a vector store score to the cosine similarity of the query and chunk"""
+        if not score:
+            return 0.0
+        if self.chroma_collection is None:
+            # FAISS and in-memory stores score unit vectors by inner product
+            return score
+        # Chroma scores are exp(-d) of the squared L2 distance d, which is
+        # 2 - 2 * cosine for the unit-length vectors OpenAI returns
+        return 1.0 + math.log(score) / 2
+    
+    def get_document(self, doc_id):
+        """Get a single document's preview and metadata by ID"""
+        if self.metadata_log:
+            record = self.metadata_log.get(doc_id)
+            if record is None:
+                return None
+            return {"content": record.get("preview") or "", "metadata": record["metadata"]}
+        
+        for doc in self.documents:
+            if doc.metadata.get("id") == doc_id:
+                return {"content": self._preview(doc.text), "metadata": doc.metadata}
+        return None
     
-    def get_all_documents(self):
-        """Get all documents with their metadata"""
+    def get_all_documents(self, limit=None, **filters):
+        """Get all documents with their metadata
+        
+        Args:
+            limit: Maximum number of documents to return
+            **filters: Metadata values the documents must match, e.g. type="report"
+        """
+        if self.metadata_log:
+            return [
+                {"content": record.get("preview") or "", "metadata": record["metadata"]}
+                for record in self.metadata_log.iter_records(limit=limit, **filters)
+            ]
+        
         docs_with_metadata = []
         for doc in self.documents:
+            if limit is not None and len(docs_with_metadata) >= limit:
+                break
+            if any(doc.metadata.get(key) != value for key, value in filters.items()):
+                continue
             docs_with_metadata.append({
-                "content": doc.text[:200] + "..." if len(doc.text) > 200 else doc.text,
+                "content": self._preview(doc.text),
                 "metadata": doc.metadata
             })
         return docs_with_metadata
-    
\ No newline at end of file
@@ -0,0 +1,200 @@
+from queue import Queue, Full
+from web import get_web_fetcher
+from summarization import split_text
+from dedup import get_dedup_index
+from tracing import bind_context, trace_span
+from config import (
+    INGEST_CHUNK_TOKENS, INGEST_CHUNK_OVERLAP, INGEST_FETCH_BATCH,
+    INGEST_QUEUE_PAGES, INDEX_BATCH_SIZE
+)
+import threading
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(items, max_items):
+    """Run a generator in a background thread, at most `max_items` ahead of the consumer
+
+    The bounded queue between the two is the backpressure: once it is full
+    the producer waits until the consumer catches up. Closing the returned
+    generator early stops the producer too.
+    """
+    queue = Queue(maxsize=max_items)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_Failure(e))
+        finally:
+            put(_DONE)
+
+    threading.Thread(target=bind_context(produce), name="ingest-prefetch", daemon=True).start()
+    try:
+        while True:
+            item = queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(items, size):
+    """Group an iterable into lists of at most `size` items, lazily"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class IngestionPipeline:
+    """Streams web pages into a ResearchIndex: fetch, clean, split, embed and upsert
+
+    Each stage is a generator feeding the next. Pages are fetched in small
+    batches by a background thread into a bounded queue, split into chunks
+    on token boundaries, and the chunks are embedded and inserted a batch at
+    a time. At most `queue_pages` pages and one batch of chunks are in
+    memory at once, however many pages are ingested.
+
+    Boilerplate (navigation, headers, footers, scripts) is stripped when a
+    page is fetched, see web.html_to_text.
+    """
+
+    def __init__(self, index, knowledge_base=None, fetcher=None, chunk_tokens=INGEST_CHUNK_TOKENS,
+                 chunk_overlap=INGEST_CHUNK_OVERLAP, fetch_batch=INGEST_FETCH_BATCH,
+                 queue_pages=INGEST_QUEUE_PAGES, index_batch=INDEX_BATCH_SIZE):
+        """Initialize the pipeline
+
+        Args:
+            index: ResearchIndex the chunks are added to
+            knowledge_base: Optional KnowledgeBase each new full page is also added to
+            fetcher: WebFetcher to use. Defaults to the process-wide one.
+            chunk_tokens: Maximum size of a chunk in tokens
+            chunk_overlap: Tokens shared by consecutive chunks
+            fetch_batch: Number of pages fetched concurrently
+            queue_pages: Maximum number of fetched pages waiting to be split
+            index_batch: Number of chunks embedded and inserted at a time
+        """
+        self.index = index
+        self.knowledge_base = knowledge_base
+        self.fetcher = fetcher
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.fetch_batch = fetch_batch
+        self.queue_pages = queue_pages
+        self.index_batch = index_batch
+
+    def fetch(self, urls):
+        """Stage 1: yield fetched pages, `fetch_batch` URLs at a time"""
+        fetcher = self.fetcher or get_web_fetcher()
+        for batch in batched(urls, self.fetch_batch):
+            with trace_span("web.fetch_many", "fetch", urls=len(batch)) as span:
+                pages = fetcher.fetch_many_sync(batch)
+                span.set(
+                    bytes_fetched=sum(page.get("bytes", 0) for page in pages),
+                    cache_hits=sum(1 for page in pages if page["from_cache"])
+                )
+            yield from pages
+
+    def accept(self, pages, results, excerpt_length=None):
+        """Stage 2: record every page and pass on the ones worth indexing
+
+        Failed pages and near-duplicates of pages seen earlier in the session
+        stop here; new pages are also added to the knowledge base.
+        """
+        dedup = get_dedup_index()
+        for page in pages:
+            result = results[page["url"]]
+            if page["error"]:
+                result["error"] = page["error"]
+                continue
+            result["excerpt"] = page["text"][:excerpt_length] if excerpt_length else ""
+            duplicate_of = dedup.check(page["text"], key=page["url"], namespace="web") if dedup is not None else None
+            if duplicate_of is not None:
+                result["duplicate_of"] = duplicate_of
+                continue
+            if self.knowledge_base is not None:
+                try:
+                    self.knowledge_base.add_sources([page])
+                except Exception as e:
+                    print(f"Error adding sources to the knowledge base: {str(e)}")
+            yield page
+
+    def split(self, pages, metadata, scope=None):
+        """Stage 3: yield each page's chunks as documents for the index"""
+        for page in pages:
+            chunks = split_text(page["text"], self.chunk_tokens, self.chunk_overlap)
+            for number, chunk in enumerate(chunks):
+                yield {
+                    "content": chunk,
+                    "metadata": {**metadata, "url": page["url"], "type": "source_chunk", "chunk": number},
+                    "scope": scope
+                }
+
+    def upsert(self, chunks, results):
+        """Stage 4: embed and insert the chunks a batch at a time
+
+        Each page's result counts the chunks the index holds for it afterwards,
+        whether added now or by an earlier run in the same scope.
+
+        Returns:
+            The number of chunks added (repeated and near-duplicate chunks are skipped)
+        """
+        added = 0
+        for batch in batched(chunks, self.index_batch):
+            added += len(self.index.add_documents(batch, batch_size=self.index_batch))
+            for chunk in batch:
+                if self.index.contains(chunk["content"], scope=chunk["scope"]):
+                    results[chunk["metadata"]["url"]]["chunks"] += 1
+        return added
+
+    def ingest(self, urls, metadata=None, excerpt_length=None, scope=None):
+        """Fetch pages and index their full text in chunks
+
+        Args:
+            urls: URLs to ingest
+            metadata: Metadata added to every chunk, e.g. {"topic": ...}
+            excerpt_length: Characters of each page's text to keep in its result
+            scope: Scope the chunks are deduplicated in, e.g. the research topic, so
+                chunks indexed for another topic are stored again with this metadata
+
+        Returns:
+            One dict per URL, in input order, with "url", "error", "duplicate_of",
+            "chunks" (chunks of the page the index holds in this scope) and "excerpt" keys
+        """
+        urls = list(dict.fromkeys(urls))
+        results = {
+            url: {"url": url, "error": None, "duplicate_of": None, "chunks": 0, "excerpt": ""}
+            for url in urls
+        }
+        with trace_span("ingest", "index", urls=len(urls)) as span:
+            pages = prefetch(self.fetch(urls), self.queue_pages)
+            accepted = self.accept(pages, results, excerpt_length)
+            chunks = self.split(accepted, dict(metadata or {}), scope)
+            added = self.upsert(chunks, results)
+            span.set(chunks=sum(result["chunks"] for result in results.values()), chunks_added=added)
+        return list(results.values())
@@ -0,0 +1,95 @@
+from datetime import datetime
+from indexing import ResearchIndex
+from config import KNOWLEDGE_BASE_DIR, KB_MAX_AGE_DAYS, KB_MIN_SCORE, KB_TOP_K
+import threading
+
+
+class KnowledgeBase:
+    """Persistent corpus of past reports and sources shared by every session
+
+    Each run's final report, and the full text of every page the researcher
+    extracts, is added here. Before going to the web the researcher can look
+    topics up locally; each hit carries its age so results older than the
+    staleness threshold can be told apart from fresh ones. A source's age
+    counts from the last time its page was extracted with the same content.
+    """
+
+    def __init__(self, persist_dir=KNOWLEDGE_BASE_DIR, max_age_days=KB_MAX_AGE_DAYS, min_score=KB_MIN_SCORE):
+        """Initialize the knowledge base
+
+        Args:
+            persist_dir: Directory holding the shared index
+            max_age_days: Results older than this are marked stale
+            min_score: Results whose cosine similarity to the query is below this are dropped
+        """
+        self.index = ResearchIndex(persist_dir=persist_dir)
+        self.max_age_days = max_age_days
+        self.min_score = min_score
+        self._lock = threading.Lock()
+
+    def add_report(self, topic, report, session_dir=None):
+        """Add a finished research report"""
+        metadata = {"topic": topic, "type": "report"}
+        if session_dir:
+            metadata["session_dir"] = session_dir
+        with self._lock:
+            return self.index.add_document(content=report, metadata=metadata)
+
+    def add_sources(self, sources, topic=None):
+        """Add extracted source documents, each a dict with "url" and "text" """
+        batch = [
+            {
+                "content": source["text"],
+                "metadata": {"url": source["url"], "type": "source", **({"topic": topic} if topic else {})}
+            }
+            for source in sources if source.get("text")
+        ]
+        with self._lock:
+            return self.index.add_documents(batch)
+
+    def save(self):
+        """Snapshot the shared index so the next session opens it quickly"""
+        with self._lock:
+            self.index.save()
+
+    def _age_days(self, metadata):
+        timestamp = metadata.get("timestamp")
+        # Content seen again after it was indexed is recorded in its metadata log entry
+        document = self.index.get_document(metadata["id"]) if metadata.get("id") else None
+        if document is not None:
+            timestamp = document["metadata"].get("last_seen") or timestamp
+        try:
+            return (datetime.now() - datetime.fromisoformat(timestamp)).total_seconds() / 86400
+        except (TypeError, ValueError):
+            return None
+
+    def lookup(self, query, top_k=KB_TOP_K, include_stale=True):
+        """Find passages relevant to a query
+
+        Returns:
+            A list of dicts with "text", "score", "metadata", "node_id",
+            "age_days" and "stale" keys, best match first
+        """
+        results = []
+        for result in self.index.retrieve(query, similarity_top_k=top_k):
+            if result["score"] < self.min_score:
+                continue
+            age_days = self._age_days(result["metadata"])
+            stale = age_days is None or age_days > self.max_age_days
+            if stale and not include_stale:
+                continue
+            results.append({**result, "age_days": age_days, "stale": stale})
+        return results
+
+
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
+
+
+def get_knowledge_base():
+    """Get the process-wide knowledge base"""
+    global _knowledge_base
+    with _knowledge_base_lock:
+        if _knowledge_base is None:
+            _knowledge_base = KnowledgeBase()
+        return _knowledge_base
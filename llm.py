@@ -0,0 +1,268 @@
+from langchain_core.caches import BaseCache
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_openai import ChatOpenAI
+from cache import MemoryCache, cache_key
+from tracing import get_tracer
+from streaming import listen_to_agent_streams
+from config import (
+    DEFAULT_LLM_MODEL, OPENAI_BASE_URL, LLM_MAX_CONNECTIONS, LLM_TIMEOUT,
+    LLM_RESPONSE_CACHE, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL
+)
+import threading
+import httpx
+import time
+
+
+class LLMResponseCache(BaseCache):
+    """Exact-match cache of LLM responses, keyed by model settings and prompt hash
+
+    Only attached to temperature-0 models, where identical prompts are
+    expected to produce identical answers.
+    """
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL):
+        self._cache = MemoryCache(max_entries, ttl=ttl)
+
+    def lookup(self, prompt, llm_string):
+        return self._cache.get(cache_key(llm_string, prompt))
+
+    def update(self, prompt, llm_string, return_val):
+        self._cache.set(cache_key(llm_string, prompt), return_val)
+
+    def clear(self, **kwargs):
+        self._cache = MemoryCache(self._cache.max_entries, ttl=self._cache.ttl)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """LangChain callback handler recording each LLM call as a span with token usage"""
+
+    def __init__(self):
+        self._spans = {}
+
+    def _start(self, serialized, run_id, **kwargs):
+        tracer = get_tracer()
+        if tracer is None:
+            return
+        model = (kwargs.get("invocation_params") or {}).get("model_name") \
+            or (kwargs.get("invocation_params") or {}).get("model") or "llm"
+        self._spans[run_id] = (tracer, tracer.start_span(model, "llm"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(serialized, run_id, **kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(serialized, run_id, **kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        entry = self._spans.pop(run_id, None)
+        if entry is None:
+            return
+        tracer, span = entry
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        span.set(
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            total_tokens=usage.get("total_tokens", 0)
+        )
+        tracer.finish_span(span)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        entry = self._spans.pop(run_id, None)
+        if entry is None:
+            return
+        tracer, span = entry
+        span.set(error=str(error))
+        tracer.finish_span(span)
+
+
+def _event_time(event):
+    """An event's timestamp on the perf_counter clock spans are timed with"""
+    return time.perf_counter() - (time.time() - event.timestamp.timestamp())
+
+
+class AgentTracingListener:
+    """Records the LLM calls of crewai agents as spans with token usage
+
+    crewai's event bus runs start and end handlers in a thread pool, with a
+    copy of the calling agent's context, so each span finds the run's tracer
+    and its parent span. The handlers can run out of order, so calls are
+    matched by call ID and timed from the events' own timestamps.
+    """
+
+    def __init__(self):
+        self._started = {}
+        self._ended = {}
+        self._lock = threading.Lock()
+        self._registered = False
+
+    def register(self):
+        """Subscribe to crewai's LLM events, once per process"""
+        with self._lock:
+            if self._registered:
+                return
+            from crewai.events import (
+                crewai_event_bus, LLMCallStartedEvent, LLMCallCompletedEvent, LLMCallFailedEvent
+            )
+            crewai_event_bus.on(LLMCallStartedEvent)(self.on_started)
+            crewai_event_bus.on(LLMCallCompletedEvent)(self.on_ended)
+            crewai_event_bus.on(LLMCallFailedEvent)(self.on_ended)
+            self._registered = True
+
+    def on_started(self, source, event):
+        tracer = get_tracer()
+        if tracer is None:
+            return
+        attrs = {"agent": event.agent_role} if getattr(event, "agent_role", None) else {}
+        span = tracer.start_span(event.model or "llm", "llm", start=_event_time(event), **attrs)
+        with self._lock:
+            ended = self._ended.pop(event.call_id, None)
+            if ended is None:
+                self._started[event.call_id] = (tracer, span)
+                return
+        self._finish(tracer, span, ended)
+
+    def on_ended(self, source, event):
+        if get_tracer() is None:
+            return
+        with self._lock:
+            entry = self._started.pop(event.call_id, None)
+            if entry is None:
+                self._ended[event.call_id] = event
+                return
+        self._finish(*entry, event)
+
+    @staticmethod
+    def _finish(tracer, span, event):
+        if getattr(event, "error", None):
+            span.set(error=event.error)
+        else:
+            usage = getattr(event, "usage", None) or {}
+            if usage.get("total_tokens"):
+                span.set(
+                    prompt_tokens=usage.get("prompt_tokens", 0),
+                    completion_tokens=usage.get("completion_tokens", 0),
+                    total_tokens=usage["total_tokens"]
+                )
+            else:
+                # Some servers leave usage out of streamed responses
+                from summarization import count_tokens
+                prompt_tokens = count_tokens(str(getattr(event, "messages", None) or ""))
+                completion_tokens = count_tokens(str(getattr(event, "response", None) or ""))
+                span.set(
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    total_tokens=prompt_tokens + completion_tokens,
+                    tokens_estimated=True
+                )
+        tracer.finish_span(span, end=_event_time(event))
+
+
+class LLMRegistry:
+    """Process-wide registry of chat models sharing one HTTP connection pool
+
+    Models are created once per (model, temperature) and reused by every
+    agent and tool, so connections stay warm between calls. Tools and
+    summaries use LangChain chat models; agents use crewai's own LLM class,
+    since crewai doesn't run LangChain models itself.
+    """
+
+    def __init__(self, base_url=OPENAI_BASE_URL, max_connections=LLM_MAX_CONNECTIONS,
+                 timeout=LLM_TIMEOUT, response_cache=LLM_RESPONSE_CACHE):
+        """Initialize the registry
+
+        Args:
+            base_url: OpenAI-compatible API base URL. Defaults to the OpenAI API;
+                point it at a local server to stand in for OpenAI.
+            max_connections: Size of the shared connection pool
+            timeout: Request timeout in seconds
+            response_cache: Whether to cache temperature-0 responses
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self.response_cache = LLMResponseCache() if response_cache else None
+        self.tracing_handler = TracingCallbackHandler()
+        self.agent_tracing_listener = AgentTracingListener()
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, model=None, temperature=0.2, **kwargs):
+        """Get the shared chat model for a model name and temperature"""
+        model = model or DEFAULT_LLM_MODEL
+        key = (model, temperature, tuple(sorted(kwargs.items())))
+        with self._lock:
+            if key not in self._models:
+                options = dict(kwargs)
+                if self.base_url:
+                    options["base_url"] = self.base_url
+                if temperature == 0 and self.response_cache is not None:
+                    options["cache"] = self.response_cache
+                self._models[key] = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client,
+                    callbacks=[self.tracing_handler],
+                    **options
+                )
+            return self._models[key]
+
+    def get_agent_llm(self, model=None, temperature=0.2, streaming=False):
+        """Get the shared crewai LLM agents run on, for a model, temperature and streaming mode
+
+        crewai builds its own OpenAI client, whose connection pool stays warm
+        because the instance is shared. Calls are traced, and streamed tokens
+        reach the active report stream, through crewai's event bus.
+        """
+        from crewai import LLM
+
+        model = model or DEFAULT_LLM_MODEL
+        key = ("agent", model, temperature, streaming)
+        with self._lock:
+            if key not in self._models:
+                self.agent_tracing_listener.register()
+                if streaming:
+                    listen_to_agent_streams()
+                options = {"base_url": self.base_url} if self.base_url else {}
+                self._models[key] = LLM(
+                    model=model,
+                    temperature=temperature,
+                    timeout=self.timeout,
+                    stream=streaming,
+                    **options
+                )
+            return self._models[key]
+
+    def stats(self):
+        return {
+            "models": len(self._models),
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Get the process-wide LLM registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = LLMRegistry()
+        return _registry
+
+
+def get_llm(model=None, temperature=0.2, **kwargs):
+    """Get a shared LLM instance with the specified parameters"""
+    return get_registry().get(model, temperature, **kwargs)
+
+
+def get_agent_llm(model=None, temperature=0.2, streaming=False):
+    """Get a shared crewai LLM for agents with the specified parameters"""
+    return get_registry().get_agent_llm(model, temperature, streaming)
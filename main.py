@@ -1,86 +1,446 @@
 import asyncio
-from crewai import Crew, Process
-from agents import create_research_crew
-from indexing import ResearchIndex
+from concurrent.futures import ThreadPoolExecutor
+from tracing import Tracer, CrewTraceCallbacks, use_tracer
 import argparse
+import json
 import os
-from config import OUTPUT_DIR
+from config import (
+    OUTPUT_DIR, BATCH_CONCURRENCY, BATCH_TOPIC_TIMEOUT, KB_MAX_AGE_DAYS,
+    SERVER_HOST, SERVER_PORT, SERVER_WORKERS, FAN_OUT_SUBQUESTIONS, FAN_OUT_CONCURRENCY, DEDUP_ENABLED
+)
+from types import SimpleNamespace
 import time
+import functools
+import threading
 from datetime import datetime
 
-async def main():
-    """Main application function"""
-    # Parse command line arguments
-    parser = argparse.ArgumentParser(description="ResearchGPT - AI Research Assistant")
-    parser.add_argument("--topic", type=str, required=True, help="Research topic")
-    parser.add_argument("--memory", action="store_true", help="Enable agent memory")
-    parser.add_argument("--persist", action="store_true", help="Enable persistent storage")
-    args = parser.parse_args()
+
+def create_session_dir(topic):
+    """Create a fresh timestamped output directory for one research run"""
+    from checkpoint import record_session
     
-    # Create output directory
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    session_dir = os.path.join(OUTPUT_DIR, f"{timestamp}_{args.topic.replace(' ', '_')}")
-    os.makedirs(session_dir, exist_ok=True)
+    base = os.path.join(OUTPUT_DIR, f"{timestamp}_{topic.replace(' ', '_')}")
+    session_dir, suffix = base, 1
+    while True:
+        try:
+            os.makedirs(session_dir)
+            record_session(session_dir, topic)
+            return session_dir
+        except FileExistsError:
+            # Same topic started twice within a second (e.g. in a batch)
+            suffix += 1
+            session_dir = f"{base}_{suffix}"
+
+
+def run_research(topic, use_memory=False, persist=False, trace_summary=False, trace_export=None,
+                 use_knowledge_base=True, research_index=None, on_event=None, stream=False,
+                 fan_out=FAN_OUT_SUBQUESTIONS, fan_out_concurrency=FAN_OUT_CONCURRENCY, resume=False):
+    """Run the research crew on one topic and save its report
+    
+    Search, extraction, embedding and LLM clients and caches are process-wide,
+    so concurrent runs share them.
+    
+    Args:
+        topic: The topic to research
+        use_memory: Whether to enable agent memory
+        persist: Whether to persist the session's vector index
+        trace_summary: Whether to print a hot-path breakdown at the end of the run
+        trace_export: Optional path for the trace, as Chrome trace JSON (.json) or JSONL (.jsonl)
+        use_knowledge_base: Whether to consult and extend the cross-session knowledge base
+        research_index: Existing ResearchIndex to add the report to, instead of opening one.
+            Ignored when persisting, since a persisted index lives in the session directory.
+        on_event: Optional callable invoked as on_event(event_type, **data) as the run
+            progresses ("step", "task" and "report" events)
+        stream: Whether to print agent tokens and append task outputs and the report
+            to the report file as they are produced, instead of writing it at the end
+        fan_out: Number of sub-questions researched concurrently before the analysis;
+            0 or 1 has one researcher cover the whole topic
+        fan_out_concurrency: Maximum number of sub-questions researched at once
+        resume: Whether to continue the topic's latest session, skipping the tasks
+            it already completed, instead of starting a new one
+        
+    Returns:
+        A dict describing the run (topic, session directory, report path, elapsed time)
+    """
+    from dedup import NearDuplicateIndex, use_dedup_index
+    from checkpoint import find_session_dir
+    
+    session_dir = None
+    if resume:
+        from agents import TASK_PROMPT_VERSION
+        session_dir = find_session_dir(topic, TASK_PROMPT_VERSION)
+    session_dir = session_dir or create_session_dir(topic)
+    
+    # Every span recorded while this run is active ends up in its metadata, and every
+    # page, chunk and document it sees is checked against the ones seen before
+    tracer = Tracer()
+    dedup_index = NearDuplicateIndex() if DEDUP_ENABLED else None
+    with use_tracer(tracer), use_dedup_index(dedup_index):
+        return _run_research(topic, session_dir, tracer, dedup_index, use_memory, persist, trace_summary,
+                             trace_export, use_knowledge_base, research_index, on_event, stream, fan_out,
+                             fan_out_concurrency, resume)
+
+
+def _run_research(topic, session_dir, tracer, dedup_index, use_memory, persist, trace_summary, trace_export,
+                  use_knowledge_base, research_index, on_event, stream, fan_out, fan_out_concurrency, resume):
+    # The agent and index frameworks take seconds to import, so load them only once a run starts
+    from agents import create_research_crew, create_subquestion_crew, TASK_PROMPT_VERSION
+    from checkpoint import CheckpointStore
+    from fanout import run_fan_out
+    from indexing import ResearchIndex
+    from knowledge import get_knowledge_base
+    from context import ContextBudget
+    from streaming import ReportStream, use_report_stream
     
     # Create research index
-    persist_dir = os.path.join(session_dir, "index") if args.persist else None
-    research_index = ResearchIndex(persist_dir=persist_dir)
+    persist_dir = os.path.join(session_dir, "index") if persist else None
+    with tracer.span("index.setup", "index"):
+        if research_index is None or persist:
+            research_index = ResearchIndex(persist_dir=persist_dir)
+        knowledge_base = get_knowledge_base() if use_knowledge_base else None
     
     # Create research crew
     print(f"\n{'='*50}")
-    print(f"Starting research on: {args.topic}")
-    print(f"Memory enabled: {args.memory}")
-    print(f"Persistent storage: {args.persist}")
+    print(f"Starting research on: {topic}")
+    print(f"Memory enabled: {use_memory}")
+    print(f"Persistent storage: {persist}")
+    if fan_out > 1:
+        print(f"Research fan-out: {fan_out} sub-questions, {fan_out_concurrency} at a time")
     print(f"{'='*50}\n")
     
     start_time = time.time()
+    report_filename = os.path.join(session_dir, f"{topic.replace(' ', '_')}_report.md")
+    report_stream = ReportStream(report_filename, topic, index=research_index) if stream else None
+    context_budget = ContextBudget()
+    
+    def emit(event_type, **data):
+        if on_event is not None:
+            on_event(event_type, **data)
+    
+    def report_step(step_output):
+        emit("step", tool=getattr(step_output, "tool", None))
+    
+    def report_task(task_output):
+        output = str(getattr(task_output, "raw", task_output))
+        emit("task", agent=str(getattr(task_output, "agent", "") or ""), output=output[:500])
+    
+    # Tasks that finished before a failed attempt are restored instead of run again
+    checkpoints = CheckpointStore(session_dir, topic, TASK_PROMPT_VERSION)
+    completed = checkpoints.load_completed() if resume else {}
+    if completed:
+        print(f"Resuming after completed tasks: {', '.join(completed)}")
+    findings, analysis, result_str = completed.get("research"), completed.get("analysis"), completed.get("report")
     
-    # Create and run the research crew
-    crew = create_research_crew(args.topic, use_memory=args.memory)
-    result = crew.kickoff()
+    # Research sub-questions concurrently; the crew then starts at the analysis
+    fan_out_stats = None
+    if findings is None and fan_out > 1:
+        with tracer.span("research.fan_out", "crew", subquestions=fan_out, concurrency=fan_out_concurrency):
+            try:
+                fan_out_stats = run_fan_out(
+                    topic,
+                    lambda question: create_subquestion_crew(
+                        question,
+                        topic,
+                        knowledge_base=knowledge_base,
+                        research_index=research_index,
+                        step_callbacks=[report_step],
+                        task_callbacks=[report_task],
+                        context_budget=context_budget
+                    ),
+                    subquestions=fan_out,
+                    concurrency=fan_out_concurrency
+                )
+            except Exception:
+                if report_stream is not None:
+                    report_stream.close()
+                raise
+        findings = fan_out_stats.pop("findings")
+        checkpoints.save("research", findings)
+    
+    # Create and run the research crew, unless the report itself was checkpointed
+    if result_str is None:
+        crew_callbacks = CrewTraceCallbacks()
+        crew = create_research_crew(
+            topic,
+            use_memory=use_memory,
+            step_callbacks=[crew_callbacks.on_step, report_step],
+            task_callbacks=[crew_callbacks.on_task, report_task, report_stream and report_stream.on_task],
+            knowledge_base=knowledge_base,
+            streaming=stream,
+            context_budget=context_budget,
+            findings=findings,
+            analysis=analysis,
+            research_index=research_index,
+            checkpoints=checkpoints
+        )
+        if report_stream is not None:
+            # Outputs produced before the crew started are streamed as if their tasks just finished
+            restored = [
+                (agent, output) for agent, output in [("Research findings", findings), ("Analysis", analysis)]
+                if output is not None
+            ]
+            report_stream.upstream_tasks = len(crew.tasks) - 1 + len(restored)
+            for agent, output in restored:
+                report_stream.on_task(SimpleNamespace(agent=agent, raw=output))
+        with tracer.span("crew.kickoff", "crew") as span, use_report_stream(report_stream):
+            crew_callbacks.start()
+            try:
+                result = crew.kickoff()
+            except Exception:
+                if report_stream is not None:
+                    report_stream.close()
+                raise
+            # crewai's own count, to check the per-call llm spans against
+            usage = getattr(crew, "usage_metrics", None)
+            if usage is not None:
+                span.set(crew_reported_tokens=usage.total_tokens, llm_requests=usage.successful_requests)
+        
+        # Convert CrewOutput to string
+        result_str = str(result)
     
     end_time = time.time()
     elapsed_time = end_time - start_time
     
-    # Convert CrewOutput to string
-    result_str = str(result)
-    
     # Store the final report in the index
     report_metadata = {
-        "topic": args.topic,
+        "topic": topic,
         "type": "report",
         "created_at": datetime.now().isoformat(),
         "elapsed_time": elapsed_time
     }
     research_index.add_document(content=result_str, metadata=report_metadata)
+    research_index.save()
+    if knowledge_base is not None:
+        knowledge_base.add_report(topic, result_str, session_dir=session_dir)
+        knowledge_base.save()
     
     # Print and save the result
     print("\n")
     print("="*50)
-    print(f" RESEARCH REPORT: {args.topic}")
+    print(f" RESEARCH REPORT: {topic}")
     print("="*50)
     print("\n")
     
-    # Save the result to a file
-    report_filename = os.path.join(session_dir, f"{args.topic.replace(' ', '_')}_report.md")
-    with open(report_filename, "w", encoding="utf-8") as f:
-        f.write(result_str)
+    # Save the result to a file, replacing the streamed draft if there is one
+    stream_stats = None
+    if report_stream is not None:
+        stream_stats = report_stream.finish(result_str)
+    else:
+        with open(report_filename, "w", encoding="utf-8") as f:
+            f.write(result_str)
+    emit("report", path=report_filename)
     
     # Save metadata
+    context_stats = context_budget.stats()
+    dedup_stats = dedup_index.stats() if dedup_index is not None else None
     metadata_filename = os.path.join(session_dir, "metadata.json")
     with open(metadata_filename, "w") as f:
-        import json
         json.dump({
-            "topic": args.topic,
+            "topic": topic,
             "created_at": datetime.now().isoformat(),
             "elapsed_time": elapsed_time,
-            "memory_enabled": args.memory,
-            "persistent_storage": args.persist
+            "memory_enabled": use_memory,
+            "persistent_storage": persist,
+            "streaming": stream_stats,
+            "fan_out": fan_out_stats,
+            "resumed_tasks": list(completed),
+            "dedup": dedup_stats,
+            "context": context_stats,
+            "trace": {
+                "summary": tracer.summary(),
+                "spans": tracer.to_dicts()
+            }
         }, f, indent=2)
     
+    if trace_export:
+        tracer.export(trace_export)
+        print(f"Trace exported to {trace_export}")
+    if trace_summary:
+        tracer.print_summary()
+    
     print(f"\nResearch completed in {elapsed_time:.2f} seconds")
+    print(f"Context budget saved {context_stats['tokens_saved']} tokens "
+          f"({context_stats['compactions']} compactions, {context_stats['cache_hits']} from cache)")
+    if dedup_stats:
+        checked = sum(entry["checked"] for entry in dedup_stats.values())
+        duplicates = sum(entry["duplicates"] for entry in dedup_stats.values())
+        print(f"Dropped {duplicates} of {checked} pages, chunks and documents as near-duplicates")
+    if fan_out_stats:
+        print(f"Fan-out merged {len(fan_out_stats['subquestions']) - fan_out_stats['failed']} sub-questions, "
+              f"dropping {fan_out_stats['duplicates_dropped']} duplicate findings")
+    if stream_stats and stream_stats["time_to_first_output"] is not None:
+        print(f"First output after {stream_stats['time_to_first_output']:.2f} seconds")
     print(f"Report saved to {report_filename}")
-    print(f"Vector index {'saved to ' + persist_dir if args.persist else 'not persisted'}")
+    print(f"Vector index {'saved to ' + persist_dir if persist else 'not persisted'}")
+    
+    return {
+        "topic": topic,
+        "session_dir": session_dir,
+        "report": report_filename,
+        "elapsed_time": elapsed_time,
+        "tokens_saved": context_stats["tokens_saved"]
+    }
+
+
+def load_topics(batch_file):
+    """Read topics from a JSONL file
+    
+    Each line is either a JSON string or an object with a "topic" key and
+    optional "memory", "persist" and "timeout" overrides. Blank lines are skipped.
+    """
+    topics = []
+    with open(batch_file, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                entry = {"topic": entry}
+            if not entry.get("topic"):
+                raise ValueError(f"{batch_file}:{line_number}: missing 'topic'")
+            topics.append(entry)
+    return topics
+
+
+async def run_batch(batch_file, concurrency=BATCH_CONCURRENCY, timeout=BATCH_TOPIC_TIMEOUT,
+                    use_memory=False, persist=False, use_knowledge_base=True):
+    """Research every topic in a JSONL file with a bounded number of concurrent crews
+    
+    Each crew runs on one of `concurrency` worker threads and writes its own
+    session directory. A topic's timeout starts when its crew does. A crew
+    that exceeds it is told to stop at its next agent step, and keeps its
+    slot until its thread has actually finished.
+    
+    Returns:
+        One result dict per topic, in file order
+    """
+    topics = load_topics(batch_file)
+    limit = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-research")
+    loop = asyncio.get_running_loop()
+    
+    async def run_one(entry):
+        async with limit:
+            start_time = time.time()
+            topic_timeout = entry.get("timeout", timeout)
+            cancelled = threading.Event()
+            
+            def stop_if_cancelled(event_type, **data):
+                if cancelled.is_set():
+                    raise TimeoutError(f"Stopped after timing out at {topic_timeout} seconds")
+            
+            future = loop.run_in_executor(executor, functools.partial(
+                run_research,
+                entry["topic"],
+                use_memory=entry.get("memory", use_memory),
+                persist=entry.get("persist", persist),
+                use_knowledge_base=use_knowledge_base,
+                on_event=stop_if_cancelled
+            ))
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), timeout=topic_timeout)
+                return {**result, "status": "completed"}
+            except asyncio.TimeoutError:
+                status, error = "timed_out", f"Timed out after {topic_timeout} seconds"
+                cancelled.set()
+                # The slot is only free once the crew has stopped
+                await asyncio.wait([future])
+            except Exception as e:
+                status, error = "failed", str(e)
+            print(f"\nResearch on '{entry['topic']}' {status.replace('_', ' ')}: {error}")
+            return {
+                "topic": entry["topic"],
+                "status": status,
+                "error": error,
+                "elapsed_time": time.time() - start_time
+            }
+    
+    print(f"Running {len(topics)} topics with concurrency {concurrency}")
+    start_time = time.time()
+    try:
+        results = await asyncio.gather(*(run_one(entry) for entry in topics))
+    finally:
+        executor.shutdown(wait=False)
+    
+    # Save a summary of the whole batch
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    summary_filename = os.path.join(OUTPUT_DIR, f"batch_{timestamp}.json")
+    with open(summary_filename, "w") as f:
+        json.dump({
+            "batch_file": batch_file,
+            "created_at": datetime.now().isoformat(),
+            "elapsed_time": time.time() - start_time,
+            "concurrency": concurrency,
+            "results": results
+        }, f, indent=2)
+    
+    completed = sum(1 for result in results if result["status"] == "completed")
+    print(f"\nBatch finished: {completed}/{len(results)} topics completed in {time.time() - start_time:.2f} seconds")
+    print(f"Batch summary saved to {summary_filename}")
+    return results
+
+
+async def main():
+    """Main application function"""
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description="ResearchGPT - AI Research Assistant")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--topic", type=str, help="Research topic")
+    target.add_argument("--batch", type=str, help="JSONL file of topics to research")
+    target.add_argument("--serve", action="store_true", help="Run a long-lived research service with an HTTP API")
+    parser.add_argument("--memory", action="store_true", help="Enable agent memory")
+    parser.add_argument("--persist", action="store_true", help="Enable persistent storage")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print agent output and write the report file as it is produced")
+    parser.add_argument("--fan-out", type=int, default=FAN_OUT_SUBQUESTIONS,
+                        help="Split the research stage into this many sub-questions researched concurrently")
+    parser.add_argument("--fan-out-concurrency", type=int, default=FAN_OUT_CONCURRENCY,
+                        help="Maximum number of sub-questions researched at once")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the topic's latest run from its last completed task")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="Maximum number of topics researched at once in batch mode")
+    parser.add_argument("--timeout", type=float, default=BATCH_TOPIC_TIMEOUT,
+                        help="Per-topic timeout in seconds in batch mode")
+    parser.add_argument("--host", type=str, default=SERVER_HOST, help="Address the service listens on")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port the service listens on")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                        help="Number of research jobs the service runs at once")
+    parser.add_argument("--trace-summary", action="store_true",
+                        help="Print a breakdown of where the run spent its time")
+    parser.add_argument("--trace-export", type=str,
+                        help="Export the trace to a file (.json for Chrome trace format, .jsonl for one span per line)")
+    parser.add_argument("--no-knowledge-base", action="store_true",
+                        help="Don't consult or extend the cross-session knowledge base")
+    parser.add_argument("--kb-max-age-days", type=float, default=KB_MAX_AGE_DAYS,
+                        help="Knowledge base results older than this many days are treated as stale")
+    args = parser.parse_args()
+    
+    use_knowledge_base = not args.no_knowledge_base
+    if use_knowledge_base:
+        from knowledge import get_knowledge_base
+        get_knowledge_base().max_age_days = args.kb_max_age_days
+    
+    if args.serve:
+        from server import serve
+        serve(host=args.host, port=args.port, workers=args.workers, use_knowledge_base=use_knowledge_base)
+    elif args.batch:
+        await run_batch(args.batch, concurrency=args.concurrency, timeout=args.timeout,
+                        use_memory=args.memory, persist=args.persist, use_knowledge_base=use_knowledge_base)
+    else:
+        try:
+            await asyncio.to_thread(run_research, args.topic, use_memory=args.memory, persist=args.persist,
+                                    trace_summary=args.trace_summary, trace_export=args.trace_export,
+                                    use_knowledge_base=use_knowledge_base, stream=args.stream,
+                                    fan_out=args.fan_out, fan_out_concurrency=args.fan_out_concurrency,
+                                    resume=args.resume)
+        except Exception:
+            # Only single-topic runs can be picked up again with --resume
+            print("\nCompleted tasks were checkpointed; re-run with --resume to continue from the failed one")
+            raise
 
 if __name__ == "__main__":
     asyncio.run(main())
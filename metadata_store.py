@@ -0,0 +1,287 @@
+from config import METADATA_COMPACT_MIN_RECORDS, METADATA_COMPACT_RATIO
+from contextlib import contextmanager
+import threading
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+class MetadataLog:
+    """Append-only JSON-lines log of document metadata
+
+    Every write appends one line to `metadata.jsonl`; nothing is rewritten in
+    place. An offset index (document ID -> byte offset and length) lets
+    lookups read a single line, and is snapshotted to `metadata.idx.json` so
+    reopening a large log only scans the tail written since the snapshot.
+    Superseded and deleted records are dropped by periodic compaction, which
+    writes a new log to a temporary file and atomically swaps it in.
+
+    Writers in several processes take turns through a lock on a sidecar file,
+    which, unlike the log, is never replaced. Each instance remembers which
+    file (device and inode) its offsets refer to, so a compaction done by
+    another process is noticed and the new log is indexed from the start.
+    """
+
+    # Number of appended records after which the offset index is snapshotted
+    SNAPSHOT_INTERVAL = 100
+
+    def __init__(self, directory, fsync=True):
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, "metadata.jsonl")
+        self.index_path = os.path.join(directory, "metadata.idx.json")
+        self.legacy_path = os.path.join(directory, "metadata.json")
+        self.lock_path = os.path.join(directory, "metadata.lock")
+        self.fsync = fsync
+
+        self._lock = threading.RLock()
+        self._offsets = {}
+        self._dead_records = 0
+        self._log_size = 0
+        self._log_id = None
+        self._unsnapshotted = 0
+
+        with self._locked():
+            open(self.log_path, "ab").close()
+            self._load()
+        self._migrate_legacy()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the exclusive log lock, shared with other processes, for the duration of the block"""
+        with self._lock:
+            with open(self.lock_path, "a+b") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _file_id(stat):
+        return [stat.st_dev, stat.st_ino]
+
+    def _load(self):
+        """Load the offset index snapshot and replay the log written after it"""
+        start = 0
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    snapshot = json.load(f)
+                # A snapshot of a log that was compacted since is useless
+                if (snapshot.get("log_id") == self._file_id(os.stat(self.log_path))
+                        and snapshot["log_size"] <= os.path.getsize(self.log_path)):
+                    self._offsets = {doc_id: tuple(entry) for doc_id, entry in snapshot["offsets"].items()}
+                    self._dead_records = snapshot.get("dead_records", 0)
+                    start = snapshot["log_size"]
+            except (OSError, ValueError, KeyError):
+                self._offsets = {}
+                self._dead_records = 0
+                start = 0
+        self._scan(start)
+
+    def _scan(self, start):
+        """Index records from `start` to the end of the log, dropping a torn last line
+
+        Only called with the log lock held, so a partial line can't be an
+        append still in progress.
+        """
+        with open(self.log_path, "rb") as f:
+            self._log_id = self._file_id(os.fstat(f.fileno()))
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._apply(record, offset, len(line))
+                offset += len(line)
+
+        # A crash mid-append leaves a partial line; cut it so new appends stay aligned
+        if offset < os.path.getsize(self.log_path):
+            os.truncate(self.log_path, offset)
+        self._log_size = offset
+
+    def _apply(self, record, offset, length):
+        doc_id = record["id"]
+        if doc_id in self._offsets:
+            self._dead_records += 1
+        if record.get("op") == "delete":
+            # The tombstone itself is dead weight as well
+            self._offsets.pop(doc_id, None)
+            self._dead_records += 1
+        else:
+            self._offsets[doc_id] = (offset, length)
+
+    def _refresh(self):
+        """Pick up records appended, or a compaction done, by another process
+
+        Call with the log lock held.
+        """
+        stat = os.stat(self.log_path)
+        if self._file_id(stat) != self._log_id or stat.st_size < self._log_size:
+            self._offsets = {}
+            self._dead_records = 0
+            self._scan(0)
+        elif stat.st_size > self._log_size:
+            self._scan(self._log_size)
+
+    def _open_current(self):
+        """Open the log for reading, with the offsets brought up to date with the file that was opened"""
+        while True:
+            f = open(self.log_path, "rb")
+            stat = os.fstat(f.fileno())
+            if self._file_id(stat) == self._log_id and stat.st_size == self._log_size:
+                return f
+            f.close()
+            with self._locked():
+                self._refresh()
+
+    def _migrate_legacy(self):
+        """Import a metadata.json written by older versions into the log"""
+        if not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, "r") as f:
+                legacy = json.load(f)
+            self.append_many([{"id": m["id"], "metadata": m} for m in legacy if "id" in m])
+            os.replace(self.legacy_path, self.legacy_path + ".migrated")
+        except Exception as e:
+            print(f"Error migrating legacy metadata: {str(e)}")
+
+    def _write_records(self, records):
+        """Append records to the log and update the offset index"""
+        lines = [(json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8") for record in records]
+        with self._locked():
+            self._refresh()
+            offset = self._log_size
+            with open(self.log_path, "ab") as f:
+                f.write(b"".join(lines))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            for record, line in zip(records, lines):
+                self._apply(record, offset, len(line))
+                offset += len(line)
+            self._log_size = offset
+            self._unsnapshotted += len(records)
+
+        if not self._maybe_compact() and self._unsnapshotted >= self.SNAPSHOT_INTERVAL:
+            self.save_index()
+
+    def append(self, doc_id, metadata, preview=None):
+        """Append (or supersede) the metadata record for a document"""
+        self.append_many([{"id": doc_id, "metadata": metadata, "preview": preview}])
+
+    def append_many(self, entries):
+        """Append several records, each a dict with "id", "metadata" and optional "preview" """
+        records = [{"op": "put", **entry} for entry in entries]
+        if records:
+            self._write_records(records)
+
+    def delete(self, doc_id):
+        """Append a tombstone for a document"""
+        if doc_id in self._offsets:
+            self._write_records([{"op": "delete", "id": doc_id}])
+
+    def _read(self, f, offset, length):
+        f.seek(offset)
+        return f.read(length)
+
+    def get(self, doc_id):
+        """Look up a single record by document ID, reading only its line"""
+        with self._lock:
+            with self._open_current() as f:
+                entry = self._offsets.get(doc_id)
+                if entry is None:
+                    return None
+                return json.loads(self._read(f, *entry))
+
+    def __contains__(self, doc_id):
+        return doc_id in self._offsets
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def iter_records(self, limit=None, **filters):
+        """Yield live records in insertion order, optionally filtered by metadata values
+
+        Records are read lazily, one line at a time. Lines that can't match
+        a filter are skipped with a substring check before being parsed.
+        """
+        with self._lock:
+            # An open file keeps its contents even if another process compacts the log meanwhile
+            f = self._open_current()
+            entries = sorted(self._offsets.values())
+        needles = [json.dumps(value, ensure_ascii=False).encode("utf-8") for value in filters.values()]
+
+        yielded = 0
+        with f:
+            for offset, length in entries:
+                if limit is not None and yielded >= limit:
+                    return
+                line = self._read(f, offset, length)
+                if not all(needle in line for needle in needles):
+                    continue
+                record = json.loads(line)
+                metadata = record.get("metadata") or {}
+                if all(metadata.get(key) == value for key, value in filters.items()):
+                    yielded += 1
+                    yield record
+
+    def _maybe_compact(self):
+        if (self._dead_records >= METADATA_COMPACT_MIN_RECORDS
+                and self._dead_records >= METADATA_COMPACT_RATIO * max(len(self._offsets), 1)):
+            self.compact()
+            return True
+        return False
+
+    def compact(self):
+        """Rewrite the log with only live records and atomically replace it"""
+        tmp_path = self.log_path + ".tmp"
+        with self._locked(), open(self.log_path, "rb") as f:
+            self._refresh()
+
+            new_offsets = {}
+            offset = 0
+            with open(tmp_path, "wb") as out:
+                for doc_id, entry in sorted(self._offsets.items(), key=lambda item: item[1]):
+                    line = self._read(f, *entry)
+                    out.write(line)
+                    new_offsets[doc_id] = (offset, len(line))
+                    offset += len(line)
+                out.flush()
+                os.fsync(out.fileno())
+
+            # Swap the files while holding the lock, so no writer appends to the old log meanwhile
+            os.replace(tmp_path, self.log_path)
+            self._log_id = self._file_id(os.stat(self.log_path))
+            self._offsets = new_offsets
+            self._dead_records = 0
+            self._log_size = offset
+            self.save_index()
+
+    def save_index(self):
+        """Atomically snapshot the offset index next to the log"""
+        with self._lock:
+            snapshot = {
+                "log_size": self._log_size,
+                "log_id": self._log_id,
+                "dead_records": self._dead_records,
+                "offsets": self._offsets,
+            }
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.index_path)
+            self._unsnapshotted = 0
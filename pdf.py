@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+from cache import DiskCache, cache_key
+from config import PDF_CACHE_DIR, PDF_MAX_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_PAGE_BATCH
+import hashlib
+import os
+
+_page_cache = None
+
+
+def _get_page_cache():
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = DiskCache(PDF_CACHE_DIR)
+    return _page_cache
+
+
+def file_hash(path):
+    """Hash a file's contents in blocks, without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_page_range(pages, page_count):
+    """Turn a spec like "1-3,7" (1-based, inclusive) into a sorted list of page numbers
+
+    Pages outside the document are ignored. None selects every page.
+    """
+    if pages is None or not str(pages).strip():
+        return list(range(1, page_count + 1))
+
+    selected = set()
+    for part in str(pages).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            start = int(start) if start.strip() else 1
+            end = int(end) if end.strip() else page_count
+            selected.update(range(start, end + 1))
+        else:
+            selected.add(int(part))
+    return sorted(page for page in selected if 1 <= page <= page_count)
+
+
+def _extract_pages(pdf_path, page_numbers):
+    """Extract the text of some pages; runs in a worker process"""
+    reader = PdfReader(pdf_path)
+    return [(number, reader.pages[number - 1].extract_text() or "") for number in page_numbers]
+
+
+def iter_pdf_pages(pdf_path, pages=None, max_workers=PDF_MAX_WORKERS):
+    """Stream (page_number, text) pairs from a PDF in page order
+
+    Page text is cached by file hash and page number, so pages already seen
+    in any session come straight from the cache. Uncached pages are parsed
+    in batches; for larger documents the batches are spread across a process
+    pool. Pages are yielded as soon as they (and every page before them)
+    are ready, so callers can start working before the whole file is parsed.
+
+    Args:
+        pdf_path: Path to the PDF file
+        pages: Optional page range spec such as "1-5,9" (1-based)
+        max_workers: Maximum number of worker processes
+    """
+    reader = PdfReader(pdf_path)
+    page_numbers = parse_page_range(pages, len(reader.pages))
+    digest = file_hash(pdf_path)
+    cache = _get_page_cache()
+
+    cached = {}
+    for number in page_numbers:
+        text = cache.get(cache_key(digest, number))
+        if text is not None:
+            cached[number] = text
+    missing = [number for number in page_numbers if number not in cached]
+    batches = [missing[i:i + PDF_PAGE_BATCH] for i in range(0, len(missing), PDF_PAGE_BATCH)]
+
+    def parsed_batches():
+        if max_workers > 1 and len(missing) >= PDF_PARALLEL_MIN_PAGES:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                yield from pool.map(_extract_pages, [pdf_path] * len(batches), batches)
+        else:
+            for batch in batches:
+                yield [(number, reader.pages[number - 1].extract_text() or "") for number in batch]
+
+    # Interleave cached pages with freshly parsed ones, keeping page order
+    parsed = parsed_batches()
+    ready = {}
+    for number in page_numbers:
+        if number in cached:
+            yield number, cached[number]
+            continue
+        while number not in ready:
+            for parsed_number, text in next(parsed):
+                cache.set(cache_key(digest, parsed_number), text)
+                ready[parsed_number] = text
+        yield number, ready.pop(number)
+
+
+def pdf_page_documents(pdf_path, pages=None, metadata=None, scope=None):
+    """Stream PDF pages as documents ready for ResearchIndex.add_documents
+
+    Documents are typed "pdf_page" unless `metadata` gives another type, and
+    are deduplicated under `scope` when indexed.
+    """
+    for number, text in iter_pdf_pages(pdf_path, pages):
+        if text.strip():
+            yield {
+                "content": text,
+                "metadata": {"type": "pdf_page", **(metadata or {}), "source": os.path.abspath(pdf_path), "page": number},
+                "scope": scope
+            }
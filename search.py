@@ -0,0 +1,168 @@
+from cache import DiskCache, MemoryCache, cache_key
+from web import run_async
+from abc import ABC, abstractmethod
+from config import (
+    TAVILY_API_KEY, TAVILY_API_URL, SEARCH_MAX_RESULTS, SEARCH_CACHE_DIR,
+    SEARCH_CACHE_TTL, SEARCH_CACHE_MEMORY_ENTRIES, SEARCH_CONCURRENCY, WEB_TIMEOUT
+)
+import threading
+import asyncio
+import httpx
+import re
+
+
+def normalize_query(query):
+    """Normalize a query so trivially different spellings share a cache entry"""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" ?!.,;:")
+
+
+class SearchBackend(ABC):
+    """Base class for search backends
+
+    Backends run on the shared background event loop and receive the pooled
+    HTTP client to issue requests with. Subclasses must implement search.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def search(self, client, query, max_results):
+        """Return a list of results, each a dict with at least "url" and "content" """
+
+
+class TavilyBackend(SearchBackend):
+    """Search through the Tavily REST API
+
+    Point `base_url` at a local server implementing `POST /search` to stand
+    in for Tavily in tests and benchmarks.
+    """
+
+    name = "tavily"
+
+    def __init__(self, api_key=TAVILY_API_KEY, base_url=TAVILY_API_URL):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+
+    async def search(self, client, query, max_results):
+        response = await client.post(
+            f"{self.base_url}/search",
+            json={"api_key": self.api_key, "query": query, "max_results": max_results}
+        )
+        response.raise_for_status()
+        return [
+            {"url": result.get("url"), "content": result.get("content")}
+            for result in response.json().get("results", [])
+        ]
+
+
+class Searcher:
+    """Cached, concurrent front end for a search backend
+
+    Results are cached by normalized query in memory and on disk for
+    `cache_ttl` seconds. search_many sends all uncached queries concurrently
+    over a single reused HTTP client.
+    """
+
+    def __init__(self, backend=None, max_results=SEARCH_MAX_RESULTS, cache_dir=SEARCH_CACHE_DIR,
+                 cache_ttl=SEARCH_CACHE_TTL, concurrency=SEARCH_CONCURRENCY, timeout=WEB_TIMEOUT):
+        """Initialize the searcher
+
+        Args:
+            backend: SearchBackend to query. Defaults to Tavily.
+            max_results: Number of results requested per query
+            cache_dir: Directory for the on-disk result cache. If None, only the memory tier is used.
+            cache_ttl: Seconds a cached result stays valid
+            concurrency: Maximum number of backend requests in flight
+            timeout: Per-request timeout in seconds
+        """
+        self.backend = backend or TavilyBackend()
+        self.max_results = max_results
+        self.memory_cache = MemoryCache(SEARCH_CACHE_MEMORY_ENTRIES, ttl=cache_ttl)
+        self.disk_cache = DiskCache(cache_dir, ttl=cache_ttl) if cache_dir else None
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._client = None
+        self._limit = None
+
+    def _key(self, query):
+        return cache_key(self.backend.name, self.max_results, normalize_query(query))
+
+    def _cached(self, key):
+        results = self.memory_cache.get(key)
+        if results is None and self.disk_cache:
+            results = self.disk_cache.get(key)
+            if results is not None:
+                self.memory_cache.set(key, results)
+        return results
+
+    def _store(self, key, results):
+        self.memory_cache.set(key, results)
+        if self.disk_cache:
+            self.disk_cache.set(key, results)
+
+    async def _search_uncached(self, query):
+        # Client and semaphore are created on the background loop that uses them
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+            self._limit = asyncio.Semaphore(self.concurrency)
+        async with self._limit:
+            return await self.backend.search(self._client, query, self.max_results)
+
+    async def _search_many(self, queries):
+        keys = [self._key(query) for query in queries]
+        results = {key: self._cached(key) for key in set(keys)}
+
+        # One request per distinct normalized query that isn't cached
+        pending = {}
+        for key, query in zip(keys, queries):
+            if results[key] is None and key not in pending:
+                pending[key] = query
+
+        fetched = await asyncio.gather(
+            *(self._search_uncached(query) for query in pending.values()),
+            return_exceptions=True
+        )
+        for key, outcome in zip(pending, fetched):
+            results[key] = outcome
+            if not isinstance(outcome, Exception):
+                self._store(key, outcome)
+
+        return [results[key] for key in keys]
+
+    def search_many(self, queries):
+        """Run several queries concurrently
+
+        Returns:
+            One entry per query, in input order: a list of results, or the
+            exception raised for that query
+        """
+        return run_async(self._search_many(list(queries)))
+
+    def search(self, query):
+        """Run a single query, raising if the backend fails"""
+        result = self.search_many([query])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+_searcher = None
+_searcher_lock = threading.Lock()
+
+
+def get_searcher():
+    """Get the process-wide searcher, shared by all search tools"""
+    global _searcher
+    with _searcher_lock:
+        if _searcher is None:
+            _searcher = Searcher()
+        return _searcher
+
+
+def set_search_backend(backend, **kwargs):
+    """Replace the process-wide searcher with one using a different backend"""
+    global _searcher
+    with _searcher_lock:
+        _searcher = Searcher(backend=backend, **kwargs)
+        return _searcher
@@ -0,0 +1,386 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from datetime import datetime
+from main import run_research
+from config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_QUEUE_SIZE, SERVER_MAX_JOBS
+import threading
+import queue
+import uuid
+import json
+import time
+
+# Seconds between keep-alive comments on an idle event stream
+EVENT_STREAM_HEARTBEAT = 15
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class Job:
+    """One queued research request, its progress events and its result"""
+
+    FINISHED = ("completed", "failed", "cancelled")
+
+    def __init__(self, topic, use_memory=False, persist=False, use_knowledge_base=True):
+        self.id = uuid.uuid4().hex
+        self.topic = topic
+        self.use_memory = use_memory
+        self.persist = persist
+        self.use_knowledge_base = use_knowledge_base
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in self.FINISHED
+
+    def add_event(self, event_type, **data):
+        """Record a progress event and wake up anyone streaming this job's events"""
+        with self._changed:
+            self.events.append({"id": len(self.events), "type": event_type, "time": time.time(), **data})
+            self._changed.notify_all()
+
+    def set_status(self, status, **data):
+        with self._changed:
+            self.status = status
+            if status == "running":
+                self.started_at = time.time()
+            elif status in self.FINISHED:
+                self.finished_at = time.time()
+            self.add_event(status, **data)
+
+    def transition(self, expected, status, **data):
+        """Change status only if the job is still in the `expected` state
+
+        Returns:
+            True if the status was changed
+        """
+        with self._changed:
+            if self.status != expected:
+                return False
+            self.set_status(status, **data)
+            return True
+
+    def wait_for_events(self, after, timeout):
+        """Block until there are events after index `after` or the job has finished
+
+        Returns:
+            The new events, which may be empty if the timeout expired
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > after or self.finished, timeout)
+            return self.events[after:]
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "topic": self.topic,
+            "status": self.status,
+            "created_at": _isoformat(self.created_at),
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(self.finished_at),
+            "result": self.result,
+            "error": self.error,
+            "events": len(self.events),
+        }
+
+
+class ResearchService:
+    """Queue of research jobs run by a fixed pool of worker threads
+
+    Clients, caches, the knowledge base and a shared research index are
+    created once by warm_up() and reused by every job; each job only builds
+    its own (topic-specific) crew. Submissions beyond `queue_size` waiting
+    jobs are refused rather than queued without bound.
+    """
+
+    def __init__(self, workers=SERVER_WORKERS, queue_size=SERVER_QUEUE_SIZE, max_jobs=SERVER_MAX_JOBS,
+                 use_knowledge_base=True):
+        """Initialize the service
+
+        Args:
+            workers: Number of jobs run at once
+            queue_size: Maximum number of jobs waiting to run
+            max_jobs: Number of jobs remembered; the oldest finished ones are forgotten first
+            use_knowledge_base: Whether jobs consult and extend the knowledge base by default
+        """
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.use_knowledge_base = use_knowledge_base
+        self.research_index = None
+        self.jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+
+    def warm_up(self):
+        """Import the frameworks and create the shared clients before the first job arrives"""
+        from agents import get_llm
+        from indexing import ResearchIndex
+        from knowledge import get_knowledge_base
+        from search import get_searcher
+        from web import get_web_fetcher
+
+        for temperature in (0, 0.2, 0.3):
+            get_llm(temperature=temperature)
+        get_searcher()
+        get_web_fetcher()
+        self.research_index = ResearchIndex()
+        if self.use_knowledge_base:
+            get_knowledge_base()
+
+    def start(self):
+        self.warm_up()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"research-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Stop the workers once they finish their current jobs; queued jobs are cancelled"""
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job.transition("queued", "cancelled", reason="server shutting down")
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, topic, use_memory=False, persist=False, use_knowledge_base=None):
+        """Queue a research job
+
+        Raises:
+            queue.Full: If the queue is already holding `queue_size` jobs
+        """
+        job = Job(topic, use_memory=use_memory, persist=persist,
+                  use_knowledge_base=self.use_knowledge_base if use_knowledge_base is None else use_knowledge_base)
+        job.add_event("queued")
+        self._queue.put_nowait(job)
+        with self._jobs_lock:
+            self.jobs[job.id] = job
+            self._forget_old_jobs()
+        return job
+
+    def _forget_old_jobs(self):
+        excess = len(self.jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished][:excess]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self._jobs_lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._jobs_lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        """Cancel a job that hasn't started yet
+
+        Returns:
+            True if the job was cancelled
+        """
+        job = self.get(job_id)
+        # The worker that dequeues a cancelled job skips it
+        return job is not None and job.transition("queued", "cancelled", reason="cancelled by client")
+
+    def stats(self):
+        jobs = self.list_jobs()
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "queued": self._queue.qsize(), "jobs": counts}
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if not job.transition("queued", "running"):
+                continue
+
+            try:
+                job.result = run_research(
+                    job.topic,
+                    use_memory=job.use_memory,
+                    persist=job.persist,
+                    use_knowledge_base=job.use_knowledge_base,
+                    research_index=self.research_index,
+                    on_event=job.add_event
+                )
+                job.set_status("completed", result=job.result)
+            except Exception as e:
+                job.error = str(e)
+                job.set_status("failed", error=job.error)
+
+
+class ResearchServer:
+    """HTTP API in front of a ResearchService
+
+    Routes:
+        POST   /jobs              Queue a job: {"topic": ..., "memory": false,
+                                  "persist": false, "knowledge_base": true}
+        GET    /jobs              List jobs
+        GET    /jobs/<id>         Job status and result
+        GET    /jobs/<id>/report  The finished report as Markdown
+        GET    /jobs/<id>/events  Progress events as a server-sent event stream;
+                                  resume with ?after=<n> or Last-Event-ID
+        DELETE /jobs/<id>         Cancel a queued job
+        GET    /health            Worker and queue counts
+    """
+
+    def __init__(self, service, host=SERVER_HOST, port=SERVER_PORT):
+        self.service = service
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._route(self, "GET")
+
+            def do_POST(self):
+                server._route(self, "POST")
+
+            def do_DELETE(self):
+                server._route(self, "DELETE")
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @staticmethod
+    def _send_json(handler, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _route(self, handler, method):
+        url = urlsplit(handler.path)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["health"] and method == "GET":
+            return self._send_json(handler, self.service.stats())
+        if parts == ["jobs"] and method == "POST":
+            return self._submit(handler)
+        if parts == ["jobs"] and method == "GET":
+            return self._send_json(handler, {"jobs": [job.to_dict() for job in self.service.list_jobs()]})
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self._send_json(handler, {"error": "not found"}, 404)
+
+        job = self.service.get(parts[1])
+        if job is None:
+            return self._send_json(handler, {"error": f"unknown job {parts[1]}"}, 404)
+        if len(parts) == 2 and method == "GET":
+            return self._send_json(handler, job.to_dict())
+        if len(parts) == 2 and method == "DELETE":
+            if self.service.cancel(job.id):
+                return self._send_json(handler, job.to_dict())
+            return self._send_json(handler, {"error": f"job is {job.status}"}, 409)
+        if parts[2:] == ["report"] and method == "GET":
+            return self._send_report(handler, job)
+        if parts[2:] == ["events"] and method == "GET":
+            # Both name the last event the client has seen
+            last_seen = parse_qs(url.query).get("after", [handler.headers.get("Last-Event-ID")])[0]
+            try:
+                start = int(last_seen) + 1 if last_seen else 0
+            except ValueError:
+                return self._send_json(handler, {"error": "'after' must be an event id"}, 400)
+            return self._stream_events(handler, job, start)
+        return self._send_json(handler, {"error": "not found"}, 404)
+
+    def _submit(self, handler):
+        try:
+            body = json.loads(handler.rfile.read(int(handler.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            return self._send_json(handler, {"error": "request body must be JSON"}, 400)
+        topic = body.get("topic") if isinstance(body, dict) else None
+        if not isinstance(topic, str) or not topic.strip():
+            return self._send_json(handler, {"error": "'topic' is required"}, 400)
+
+        try:
+            job = self.service.submit(
+                topic.strip(),
+                use_memory=bool(body.get("memory", False)),
+                persist=bool(body.get("persist", False)),
+                use_knowledge_base=body.get("knowledge_base")
+            )
+        except queue.Full:
+            return self._send_json(handler, {"error": "job queue is full, try again later"}, 503)
+        self._send_json(handler, job.to_dict(), 202)
+
+    def _send_report(self, handler, job):
+        if job.status != "completed":
+            return self._send_json(handler, {"error": f"job is {job.status}"}, 409)
+        with open(job.result["report"], "rb") as f:
+            data = f.read()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/markdown; charset=utf-8")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _stream_events(self, handler, job, after):
+        """Replay a job's events from `after`, then stream new ones until the job finishes"""
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+        try:
+            while True:
+                events = job.wait_for_events(after, EVENT_STREAM_HEARTBEAT)
+                for event in events:
+                    handler.wfile.write(
+                        f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+                    )
+                after += len(events)
+                if not events:
+                    handler.wfile.write(b": keep-alive\n\n")
+                handler.wfile.flush()
+                if job.finished and after >= len(job.events):
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; the job carries on
+            return
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS, use_knowledge_base=True):
+    """Run the research service until interrupted"""
+    service = ResearchService(workers=workers, use_knowledge_base=use_knowledge_base)
+    print("Warming up shared clients and indexes...")
+    service.start()
+    server = ResearchServer(service, host=host, port=port)
+    print(f"Research service listening on {server.url} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down research service")
+    finally:
+        server.shutdown()
+        service.stop()
@@ -0,0 +1,224 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from tracing import bind_context
+import threading
+import time
+import os
+
+_current_stream = ContextVar("current_report_stream", default=None)
+
+
+class ReportStream:
+    """Writes a report to the console and to its file while the crew is still working
+
+    Each upstream task's output is appended as soon as the task finishes, and
+    the report task's answer is appended token by token. Every Markdown
+    section of the answer is handed to the index in the background as soon
+    as the next heading starts. finish() replaces the file with the final
+    report once the crew is done.
+    """
+
+    FINAL_ANSWER = "Final Answer:"
+
+    def __init__(self, path, topic, index=None, upstream_tasks=0, echo=True):
+        """Initialize the stream
+
+        Args:
+            path: Report file, truncated on open
+            topic: Research topic, recorded with every indexed section
+            index: Optional ResearchIndex that finished sections are added to
+            upstream_tasks: Number of tasks that run before the report task;
+                tokens are only written to the file once they have all finished
+            echo: Whether to print to the console as well
+        """
+        self.path = path
+        self.topic = topic
+        self.index = index
+        self.upstream_tasks = upstream_tasks
+        self.echo = echo
+        self.started_at = time.perf_counter()
+        self.first_output_at = None
+        self.first_token_at = None
+        self.sections_indexed = 0
+
+        self._file = open(path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-index")
+        self._pending = []
+        self._tasks_done = 0
+        self._call_id = None
+        self._generation = ""
+        self._answering = False
+        self._answer_started = False
+        self._line = ""
+        self._section = []
+
+    @property
+    def time_to_first_output(self):
+        return None if self.first_output_at is None else self.first_output_at - self.started_at
+
+    @property
+    def time_to_first_token(self):
+        return None if self.first_token_at is None else self.first_token_at - self.started_at
+
+    def _mark_output(self):
+        if self.first_output_at is None:
+            self.first_output_at = time.perf_counter()
+
+    def _echo(self, text):
+        self._mark_output()
+        if self.echo:
+            print(text, end="", flush=True)
+
+    def _append(self, text):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(text)
+            self._file.flush()
+
+    def _index_in_background(self, content, **metadata):
+        if self.index is None or not content.strip():
+            return
+        self._pending.append(self._executor.submit(
+            bind_context(self.index.add_document),
+            content=content,
+            metadata={"topic": self.topic, **metadata}
+        ))
+
+    def on_task(self, task_output):
+        """Crew task callback: append an upstream task's output as soon as it finishes"""
+        self._tasks_done += 1
+        if self._tasks_done > self.upstream_tasks:
+            return
+        agent = str(getattr(task_output, "agent", "") or f"Task {self._tasks_done}").strip()
+        output = str(getattr(task_output, "raw", task_output))
+        text = f"## {agent}\n\n{output}\n\n"
+        self._echo(f"\n\n{text}")
+        self._append(text)
+        self._index_in_background(output, type="task_output", agent=agent)
+
+    def start_generation(self):
+        self._generation = ""
+        self._answering = False
+        self._answer_started = False
+
+    def on_token(self, token, call_id=None):
+        """Echo a token and, once the report task's final answer starts, append it to the file
+
+        Args:
+            token: The streamed text
+            call_id: Identifier of the LLM call the token belongs to; a new one
+                starts a new generation
+        """
+        if call_id is not None and call_id != self._call_id:
+            self._call_id = call_id
+            self.start_generation()
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self._echo(token)
+        if self._tasks_done < self.upstream_tasks:
+            return
+        if not self._answering:
+            # Agents think out loud before the answer; only the answer belongs in the report
+            self._generation += token
+            marker = self._generation.find(self.FINAL_ANSWER)
+            if marker < 0:
+                return
+            self._answering = True
+            token = self._generation[marker + len(self.FINAL_ANSWER):]
+        if not self._answer_started:
+            # Skip the whitespace between the marker and the answer, however it was tokenized
+            token = token.lstrip()
+            self._answer_started = bool(token)
+        if token:
+            self._append(token)
+            self._track_sections(token)
+
+    def _track_sections(self, text):
+        self._line += text
+        while "\n" in self._line:
+            line, self._line = self._line.split("\n", 1)
+            if line.startswith("#") and any(part.strip() for part in self._section):
+                self._flush_section()
+            self._section.append(line)
+
+    def _flush_section(self):
+        content = "\n".join(self._section).strip()
+        self._section = []
+        if content:
+            title = content.splitlines()[0].lstrip("#").strip()
+            self._index_in_background(content, type="report_section", section=title)
+            self.sections_indexed += 1
+
+    def close(self):
+        """Stop streaming without writing a final report (e.g. when the crew failed)"""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._file.close()
+
+    def finish(self, report):
+        """Index the last section, wait for background indexing and write the final report
+
+        Returns:
+            A dict with the times to first output and to first streamed token, and the
+            number of sections indexed
+        """
+        if self._line:
+            self._section.append(self._line)
+            self._line = ""
+        self._flush_section()
+        for future in self._pending:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error indexing report section: {str(e)}")
+        self.close()
+
+        # The streamed file holds drafts and partial output; swap in the finished report
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(report)
+        os.replace(tmp_path, self.path)
+        return {
+            "time_to_first_output": self.time_to_first_output,
+            "time_to_first_token": self.time_to_first_token,
+            "sections_indexed": self.sections_indexed
+        }
+
+
+@contextmanager
+def use_report_stream(stream):
+    """Send streamed agent tokens in the current context to `stream`"""
+    token = _current_stream.set(stream)
+    try:
+        yield stream
+    finally:
+        _current_stream.reset(token)
+
+
+_listener_lock = threading.Lock()
+_listening = False
+
+
+def listen_to_agent_streams():
+    """Forward the tokens crewai agents stream to the active report stream
+
+    Registered once per process on crewai's event bus. Chunk events are
+    handled in the thread of the agent that streamed them, so tokens are
+    routed by context, and each LLM call's first chunk starts a new generation.
+    """
+    global _listening
+    with _listener_lock:
+        if _listening:
+            return
+        from crewai.events import crewai_event_bus, LLMStreamChunkEvent
+
+        @crewai_event_bus.on(LLMStreamChunkEvent)
+        def on_chunk(source, event):
+            stream = _current_stream.get()
+            if stream is not None and event.chunk:
+                stream.on_token(event.chunk, call_id=event.call_id)
+
+        _listening = True
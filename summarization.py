@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+from langchain_text_splitters import TokenTextSplitter
+from cache import DiskCache, cache_key
+from llm import get_llm
+from tracing import bind_context
+from dedup import get_dedup_index
+from config import (
+    SUMMARY_CHUNK_TOKENS, SUMMARY_CHUNK_OVERLAP,
+    SUMMARY_REDUCE_TOKENS, SUMMARY_MAX_WORKERS, SUMMARY_CACHE_DIR
+)
+import tiktoken
+
+# Bump when the prompts change so stale cached summaries aren't reused
+PROMPT_VERSION = "1"
+
+MAP_PROMPT = """Write a concise summary of the following excerpt. Keep every key fact, figure and source reference.
+
+{text}
+
+CONCISE SUMMARY:"""
+
+COMBINE_PROMPT = """The following are summaries of consecutive parts of one document. Merge them into a single concise summary without losing key facts, figures or source references.
+
+{text}
+
+MERGED SUMMARY:"""
+
+FINAL_PROMPT = """The following are summaries of consecutive parts of one document. Write a final summary of the whole document in at most {max_words} words.
+
+{text}
+
+FINAL SUMMARY:"""
+
+STUFF_PROMPT = """Write a concise summary of the following in at most {max_words} words:
+
+{text}
+
+CONCISE SUMMARY:"""
+
+_encoding = tiktoken.get_encoding("cl100k_base")
+_summary_cache = None
+
+
+def count_tokens(text):
+    """Count tokens the way the splitter does"""
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut text down to at most `max_tokens` tokens"""
+    tokens = _encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return _encoding.decode(tokens[:max_tokens])
+
+
+def split_text(text, chunk_tokens=SUMMARY_CHUNK_TOKENS, overlap=SUMMARY_CHUNK_OVERLAP):
+    """Split text into chunks of at most `chunk_tokens` tokens on token boundaries"""
+    splitter = TokenTextSplitter(encoding_name="cl100k_base", chunk_size=chunk_tokens, chunk_overlap=overlap)
+    return splitter.split_text(text)
+
+
+def _get_summary_cache():
+    global _summary_cache
+    if _summary_cache is None:
+        _summary_cache = DiskCache(SUMMARY_CACHE_DIR)
+    return _summary_cache
+
+
+def _complete(llm, prompt, text, **kwargs):
+    """Run one summarization prompt, serving repeated inputs from the cache"""
+    cache = _get_summary_cache()
+    key = cache_key(PROMPT_VERSION, llm.model_name, prompt, sorted(kwargs.items()), text)
+    summary = cache.get(key)
+    if summary is None:
+        summary = llm.invoke(prompt.format(text=text, **kwargs)).content
+        cache.set(key, summary)
+    return summary
+
+
+def _group_by_tokens(texts, budget):
+    """Group consecutive texts so each group fits in `budget` tokens"""
+    groups, current, used = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def map_reduce_summarize(text, max_words=300, llm=None, max_workers=SUMMARY_MAX_WORKERS,
+                         chunk_tokens=SUMMARY_CHUNK_TOKENS, reduce_tokens=SUMMARY_REDUCE_TOKENS):
+    """Summarize text of any length with a parallel map-reduce
+
+    The text is split on token boundaries and each chunk is summarized
+    concurrently. Chunk summaries are then merged in groups that fit in
+    `reduce_tokens`, level by level, until a single summary remains. Every
+    LLM call is cached by content hash, so re-summarizing a document (or one
+    sharing chunks with it) only pays for the parts that changed. Within a
+    research session, a chunk that nearly duplicates one seen before is
+    replaced by it, so near-copies hit the cache too.
+
+    Args:
+        text: The text to summarize
+        max_words: Target length of the final summary
+        llm: Chat model to use. Defaults to the configured model at temperature 0.
+        max_workers: Maximum number of concurrent LLM calls
+        chunk_tokens: Size of the chunks summarized in the map step
+        reduce_tokens: Token budget of each merge call in the reduce step
+
+    Returns:
+        The summary text
+    """
+    llm = llm or get_llm(temperature=0)
+
+    chunks = split_text(text, chunk_tokens)
+    dedup = get_dedup_index()
+    if dedup is not None:
+        # Near-duplicate chunks map onto the first one seen, so their summaries come from the
+        # cache, and repeats within this text are summarized once
+        chunks = list(dict.fromkeys(dedup.canonical(chunk, namespace="summary_chunk") for chunk in chunks))
+    if len(chunks) == 1:
+        return _complete(llm, STUFF_PROMPT, chunks[0], max_words=max_words)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        summaries = list(pool.map(bind_context(lambda chunk: _complete(llm, MAP_PROMPT, chunk)), chunks))
+
+        groups = _group_by_tokens(summaries, reduce_tokens)
+        while len(groups) > 1:
+            summaries = list(pool.map(
+                bind_context(lambda group: _complete(llm, COMBINE_PROMPT, "\n\n".join(group))), groups
+            ))
+            next_groups = _group_by_tokens(summaries, reduce_tokens)
+            if len(next_groups) >= len(groups):
+                # Merging didn't shrink anything; pair groups up to guarantee progress
+                next_groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+            groups = next_groups
+
+    return _complete(llm, FINAL_PROMPT, "\n\n".join(groups[0]), max_words=max_words)
@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+from crewai.events import (
+    crewai_event_bus, LLMCallStartedEvent, LLMCallCompletedEvent, LLMCallFailedEvent
+)
+from crewai.events.types.llm_events import LLMCallType
+from llm import AgentTracingListener
+from tracing import Tracer, use_tracer
+
+
+def _started(call_id):
+    return LLMCallStartedEvent(call_id=call_id, model="gpt-4o-mini",
+                               messages=[{"role": "user", "content": "What is new in batteries?"}])
+
+
+def _completed(call_id, usage=None):
+    return LLMCallCompletedEvent(call_id=call_id, model="gpt-4o-mini", response="Solid-state cells.",
+                                 call_type=LLMCallType.LLM_CALL, usage=usage)
+
+
+def test_records_span_with_reported_usage():
+    tracer, listener = Tracer(), AgentTracingListener()
+    with use_tracer(tracer):
+        listener.on_started(None, _started("call-1"))
+        listener.on_ended(None, _completed("call-1", {"prompt_tokens": 12, "completion_tokens": 5,
+                                                      "total_tokens": 17}))
+    (span,) = tracer.spans
+    assert (span.name, span.category) == ("gpt-4o-mini", "llm")
+    assert span.attrs["total_tokens"] == 17
+    assert span.end >= span.start
+
+
+def test_estimates_tokens_when_usage_is_missing():
+    tracer, listener = Tracer(), AgentTracingListener()
+    with use_tracer(tracer):
+        listener.on_started(None, _started("call-1"))
+        listener.on_ended(None, _completed("call-1"))
+    (span,) = tracer.spans
+    assert span.attrs["tokens_estimated"] is True
+    assert span.attrs["total_tokens"] > 0
+
+
+def test_matches_events_handled_out_of_order():
+    tracer, listener = Tracer(), AgentTracingListener()
+    with use_tracer(tracer):
+        listener.on_ended(None, LLMCallFailedEvent(call_id="call-1", model="gpt-4o-mini", error="rate limited"))
+        listener.on_started(None, _started("call-1"))
+    (span,) = tracer.spans
+    assert span.attrs["error"] == "rate limited"
+
+
+def test_ignores_calls_outside_a_traced_run():
+    tracer, listener = Tracer(), AgentTracingListener()
+    listener.on_started(None, _started("call-1"))
+    listener.on_ended(None, _completed("call-1"))
+    assert tracer.spans == []
+
+
+def test_spans_recorded_through_the_event_bus():
+    tracer, listener = Tracer(), AgentTracingListener()
+    with crewai_event_bus.scoped_handlers():
+        listener.register()
+        with use_tracer(tracer), tracer.span("crew.kickoff", "crew") as kickoff:
+            for event in (_started("call-1"), _completed("call-1", {"total_tokens": 3})):
+                future = crewai_event_bus.emit(None, event)
+                if future is not None:
+                    future.result(timeout=5)
+    llm_spans = [span for span in tracer.spans if span.category == "llm"]
+    assert len(llm_spans) == 1
+    assert llm_spans[0].parent_id == kickoff.id
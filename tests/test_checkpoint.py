@@ -0,0 +1,34 @@
+from checkpoint import TASKS, CheckpointStore, find_session_dir, record_session
+
+
+def make_session(output_dir, name, topic, tasks):
+    session_dir = output_dir / name
+    session_dir.mkdir()
+    record_session(str(session_dir), topic)
+    checkpoints = CheckpointStore(str(session_dir), topic, "1", model="model")
+    for task_name in tasks:
+        checkpoints.save(task_name, f"{task_name} output")
+    return str(session_dir)
+
+
+def test_finds_latest_session_with_unfinished_tasks(tmp_path):
+    make_session(tmp_path, "20260101_000000_topic", "topic", ["research"])
+    latest = make_session(tmp_path, "20260102_000000_topic", "topic", ["research", "analysis"])
+    make_session(tmp_path, "20260103_000000_other", "other", ["research"])
+
+    assert find_session_dir("topic", "1", model="model", output_dir=str(tmp_path)) == latest
+
+
+def test_skips_finished_and_empty_sessions(tmp_path):
+    unfinished = make_session(tmp_path, "20260101_000000_topic", "topic", ["research"])
+    make_session(tmp_path, "20260102_000000_topic", "topic", TASKS)
+    make_session(tmp_path, "20260103_000000_topic", "topic", [])
+
+    assert find_session_dir("topic", "1", model="model", output_dir=str(tmp_path)) == unfinished
+
+
+def test_no_resumable_session(tmp_path):
+    make_session(tmp_path, "20260101_000000_topic", "topic", TASKS)
+
+    assert find_session_dir("topic", "1", model="model", output_dir=str(tmp_path)) is None
+    assert find_session_dir("topic", "1", model="model", output_dir=str(tmp_path / "missing")) is None
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("crewai")
+from crewai import Agent
+from crewai.hooks import LLMCallHookContext, get_before_llm_call_hooks
+
+import context
+from context import ContextBudget
+from summarization import count_tokens
+
+
+class RecordingBudget(ContextBudget):
+    """Budget that "summarizes" without a model, remembering what it was asked to compact"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.compacted = []
+
+    def compact(self, text, max_tokens=None, source="text"):
+        self.compacted.append((text, max_tokens, source))
+        self.record(source, count_tokens(text), 5)
+        return "searched twice, found the launch date"
+
+
+def conversation(steps, words_per_step=300):
+    messages = [
+        {"role": "system", "content": "You are a researcher."},
+        {"role": "user", "content": "Research the topic."},
+    ]
+    for step in range(steps):
+        messages.append({"role": "assistant", "content": f"Thought: search step {step}"})
+        messages.append({"role": "user", "content": f"Observation: {'result ' * words_per_step}"})
+    return messages
+
+
+def test_conversation_within_budget_is_unchanged():
+    budget = RecordingBudget()
+    messages = conversation(2)
+
+    budget.fit_messages(messages, max_tokens=10_000)
+
+    assert messages == conversation(2)
+    assert budget.compacted == []
+
+
+def test_earlier_steps_are_summarized_and_the_latest_turn_kept():
+    budget = RecordingBudget()
+    messages = conversation(4)
+    latest = messages[-2:]
+
+    budget.fit_messages(messages, max_tokens=800, source="memory:researcher")
+
+    assert messages[:2] == conversation(4)[:2]
+    assert messages[2] == {
+        "role": "user", "content": "Summary of your earlier steps:\nsearched twice, found the launch date"
+    }
+    assert messages[3:] == latest
+    (history, max_tokens, source), = budget.compacted
+    assert "search step 0" in history and "search step 3" not in history
+    assert max_tokens < 800 and source == "memory:researcher"
+    assert budget.stats()["sources"]["memory:researcher"]["count"] == 1
+
+
+def test_bound_agent_is_compacted_by_the_crewai_hook():
+    budget = RecordingBudget(agent_tokens={"analyst": 800})
+    analyst = Agent(role="Data Analyst", goal="Analyze", backstory="Analyst")
+    other = Agent(role="Writer", goal="Write", backstory="Writer")
+    budget.bind(analyst, "analyst")
+    assert context._fit_agent_context in get_before_llm_call_hooks()
+
+    unbound = conversation(4)
+    context._fit_agent_context(LLMCallHookContext(messages=unbound, agent=other))
+    assert unbound == conversation(4)
+
+    messages = conversation(4)
+    context._fit_agent_context(LLMCallHookContext(messages=messages, agent=analyst))
+    assert len(messages) == 5
+    assert budget.compacted[0][2] == "memory:Data Analyst"
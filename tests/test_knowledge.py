@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+import hashlib
+import re
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+from llama_index.core.embeddings import BaseEmbedding
+
+import indexing
+from knowledge import KnowledgeBase
+
+
+class BagOfWordsEmbedding(BaseEmbedding):
+    """Unit-length word-count vectors, so texts sharing words score high and unrelated texts near zero"""
+
+    dim: int = 512
+
+    def _embed(self, text):
+        vector = [0.0] * self.dim
+        for word in re.findall(r"[a-z]+", text.lower()):
+            vector[int(hashlib.sha256(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def _get_text_embedding(self, text):
+        return self._embed(text)
+
+    def _get_query_embedding(self, query):
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query):
+        return self._embed(query)
+
+
+PAGE = (
+    "Solid state batteries replace the liquid electrolyte with a ceramic or polymer "
+    "separator, which raises energy density and removes the flammable solvent."
+)
+
+
+@pytest.fixture(params=["chroma", "faiss"])
+def knowledge_base(request, tmp_path, monkeypatch):
+    pytest.importorskip("chromadb" if request.param == "chroma" else "faiss")
+    monkeypatch.setattr(indexing, "VECTOR_BACKEND", request.param)
+    monkeypatch.setattr(indexing, "get_embed_model", lambda *args, **kwargs: BagOfWordsEmbedding())
+    return KnowledgeBase(persist_dir=str(tmp_path / "kb"), max_age_days=30)
+
+
+def test_on_topic_query_is_a_hit(knowledge_base):
+    knowledge_base.add_sources([{"url": "https://example.com/batteries", "text": PAGE}])
+
+    results = knowledge_base.lookup("solid state batteries ceramic electrolyte energy density")
+
+    assert [result["metadata"]["url"] for result in results] == ["https://example.com/batteries"]
+    assert not results[0]["stale"]
+
+
+def test_off_topic_query_is_not_a_hit(knowledge_base):
+    knowledge_base.add_sources([{"url": "https://example.com/batteries", "text": PAGE}])
+
+    assert knowledge_base.lookup("medieval monastery architecture in northern italy") == []
+
+
+def test_refetched_page_is_fresh_again(knowledge_base):
+    old = (datetime.now() - timedelta(days=90)).isoformat()
+    knowledge_base.index.add_document(
+        PAGE, metadata={"url": "https://example.com/batteries", "type": "source", "timestamp": old}
+    )
+    query = "solid state batteries ceramic electrolyte energy density"
+    assert knowledge_base.lookup(query)[0]["stale"]
+
+    # Extracting the unchanged page again adds nothing but resets its age
+    assert knowledge_base.add_sources([{"url": "https://example.com/batteries", "text": PAGE}]) == []
+
+    result, = knowledge_base.lookup(query)
+    assert not result["stale"]
+    assert result["age_days"] < 1
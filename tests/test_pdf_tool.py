@@ -0,0 +1,83 @@
+import shutil
+
+import pytest
+
+pytest.importorskip("pypdf")
+pytest.importorskip("crewai")
+
+import pdf
+from cache import DiskCache
+from dedup import NearDuplicateIndex, use_dedup_index
+from fakes import make_text_pdf
+from tools import extract_content_from_pdf
+
+
+class RecordingIndex:
+    """Collects what the tool indexes, consuming documents lazily like ResearchIndex"""
+
+    def __init__(self):
+        self.documents = []
+
+    def add_documents(self, batch):
+        ids = []
+        for document in batch:
+            self.documents.append(document)
+            ids.append(f"doc-{len(ids)}")
+        return ids
+
+
+@pytest.fixture(autouse=True)
+def page_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf, "_page_cache", DiskCache(str(tmp_path / "pdf_pages")))
+
+
+@pytest.fixture
+def long_pdf(tmp_path):
+    return make_text_pdf(str(tmp_path / "long.pdf"), 12)
+
+
+def test_reading_stops_once_the_excerpt_is_full(long_pdf, monkeypatch):
+    parsed = []
+    iter_pdf_pages = pdf.iter_pdf_pages
+
+    def counting_pages(*args, **kwargs):
+        for number, text in iter_pdf_pages(*args, **kwargs):
+            parsed.append(number)
+            yield number, text
+    monkeypatch.setattr("tools.iter_pdf_pages", counting_pages)
+
+    content = extract_content_from_pdf(long_pdf, max_length=2000)
+
+    assert content.endswith("[Stopped after page 1; pass pages starting at 2 to read on.]")
+    assert len(parsed) < 12
+
+
+def test_short_selection_is_returned_whole(long_pdf):
+    content = extract_content_from_pdf(long_pdf, pages="3", max_length=100_000)
+
+    assert content == dict(pdf.iter_pdf_pages(long_pdf, "3"))[3]
+
+
+def test_every_page_is_indexed_page_by_page(long_pdf):
+    index = RecordingIndex()
+
+    content = extract_content_from_pdf(long_pdf, max_length=500, research_index=index, topic="batteries")
+
+    assert [document["metadata"]["page"] for document in index.documents] == list(range(1, 13))
+    first = index.documents[0]
+    assert first["scope"] == "batteries"
+    assert first["metadata"]["type"] == "source_chunk" and first["metadata"]["topic"] == "batteries"
+    assert content.startswith(first["content"][:500])
+    assert "12 pages indexed, 12 of them new" in content
+
+
+def test_rereading_a_file_is_not_a_duplicate_but_a_mirror_is(long_pdf, tmp_path):
+    mirror = shutil.copy(long_pdf, tmp_path / "mirror.pdf")
+    with use_dedup_index(NearDuplicateIndex()):
+        first_pages = extract_content_from_pdf(long_pdf, pages="1-3")
+        everything = extract_content_from_pdf(long_pdf)
+        mirrored = extract_content_from_pdf(str(mirror))
+
+    assert not first_pages.startswith("Skipped")
+    assert not everything.startswith("Skipped")
+    assert mirrored == f"Skipped: near-duplicate of {long_pdf}, which was already extracted."
@@ -0,0 +1,17 @@
+import pytest
+
+from search import SearchBackend, TavilyBackend
+
+
+def test_backend_without_search_fails_at_construction():
+    class Incomplete(SearchBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    with pytest.raises(TypeError):
+        SearchBackend()
+
+
+def test_tavily_backend_is_complete():
+    assert TavilyBackend(api_key="key", base_url="http://127.0.0.1:1/").base_url == "http://127.0.0.1:1"
@@ -1,57 +1,264 @@
-from langchain_community.tools import TavilySearchResults
-from langchain_community.document_loaders import WebBaseLoader, PyPDFLoader
 from langchain_core.tools import Tool
-from langchain_openai import ChatOpenAI
-from langchain.chains.summarize import load_summarize_chain
-from langchain.docstore.document import Document
 from crewai.tools import BaseTool
-from config import DEFAULT_LLM_MODEL
-from bs4 import BeautifulSoup
+from web import get_web_fetcher
+from search import get_searcher
+from summarization import map_reduce_summarize
+from pdf import iter_pdf_pages, pdf_page_documents
+from dedup import get_dedup_index
+from ingest import IngestionPipeline
+from config import SOURCE_SEARCH_TOP_K
+from tracing import traced, trace_span
+from typing import Any, List, Optional, Union
 import os
 
 
 class SearchTool(BaseTool):
     name: str = "web_search"
     description: str = "Search the web for information. Input should be a search query."
+    searcher: Any = None
 
+    def _get_searcher(self):
+        return self.searcher or get_searcher()
+
+    @traced("tool")
+    def _run(self, query: str) -> str:
+        try:
+            return self._get_searcher().search(query)
+        except Exception as e:
+            return f"Error searching the web: {str(e)}"
+
+    def search_many(self, queries):
+        """Run several queries concurrently, returning results in input order"""
+        return [
+            f"Error searching the web: {str(result)}" if isinstance(result, Exception) else result
+            for result in self._get_searcher().search_many(queries)
+        ]
+
+
+class KnowledgeBaseTool(BaseTool):
+    name: str = "knowledge_base"
+    description: str = (
+        "Search the local knowledge base of past research reports and sources. "
+        "Use this before searching the web. Input should be a search query. "
+        "Results show their age; results marked STALE may be out of date."
+    )
+    knowledge_base: Any = None
+
+    @traced("tool")
+    def _run(self, query: str) -> str:
+        try:
+            results = self.knowledge_base.lookup(query)
+        except Exception as e:
+            return f"Error searching the knowledge base: {str(e)}"
+        
+        if not results or all(result["stale"] for result in results):
+            prefix = "No fresh results in the knowledge base; search the web instead."
+            if not results:
+                return prefix
+        else:
+            prefix = f"Found {sum(not result['stale'] for result in results)} fresh results in the knowledge base."
+        
+        sections = [prefix]
+        for result in results:
+            metadata = result["metadata"]
+            age = f"{result['age_days']:.1f} days old" if result["age_days"] is not None else "unknown age"
+            source = metadata.get("url") or f"report on '{metadata.get('topic', 'unknown topic')}'"
+            freshness = "STALE" if result["stale"] else "fresh"
+            sections.append(f"[{freshness} | {age} | score {result['score']:.2f}] Source: {source}\n{result['text']}")
+        return "\n\n".join(sections)
+
+
+class SourceSearchTool(BaseTool):
+    name: str = "source_search"
+    description: str = (
+        "Search the full text of every web page extracted during this research for the "
+        "passages most relevant to a question. Input should be a question or search query."
+    )
+    research_index: Any = None
+    topic: Optional[str] = None
+    top_k: int = SOURCE_SEARCH_TOP_K
+
+    @traced("tool")
     def _run(self, query: str) -> str:
-        search = TavilySearchResults()
-        response = search.invoke(query)
-        return response
+        try:
+            results = self.research_index.retrieve(
+                query, similarity_top_k=self.top_k, topic=self.topic, doc_type="source_chunk"
+            )
+        except Exception as e:
+            return f"Error searching extracted pages: {str(e)}"
+        if not results:
+            return "No extracted pages match; extract some pages with web_extractor first."
+        return "\n\n".join(
+            f"[score {result['score']:.2f}] Source: {result['metadata'].get('url', 'unknown')}"
+            f"{', page ' + str(result['metadata']['page']) if result['metadata'].get('page') else ''}\n{result['text']}"
+            for result in results
+        )
 
 
 class WebExtractor(BaseTool):
     name: str = "web_extractor"
-    description: str = "Extract content from a web page. Input should be a URL."
+    description: str = (
+        "Extract content from web pages. Input should be a URL, or a list of URLs "
+        "(or several URLs separated by spaces or newlines) to fetch them in one batch."
+    )
     max_length: int = 2000
+    knowledge_base: Any = None
+    # With an index, whole pages are chunked into it for source_search, not just the excerpt returned
+    research_index: Any = None
+    topic: Optional[str] = None
 
-    def _run(self, url: str) -> str:
+    @traced("tool")
+    def _run(self, url: Union[str, List[str]]) -> str:
+        # Commas are valid inside URLs, so only whitespace separates them
+        urls = url.split() if isinstance(url, str) else [u.strip() for u in url if u and u.strip()]
+        if len(urls) == 1:
+            return self.extract_many(urls)[0]
+        
+        sections = [f"## {u}\n{content}" for u, content in zip(urls, self.extract_many(urls))]
+        return "\n\n".join(sections)
+
+    def extract_many(self, urls):
+        """Fetch several pages concurrently, returning their text in input order"""
+        if self.research_index is not None:
+            return self._ingest_many(urls)
+        
+        with trace_span("web.fetch_many", "fetch", urls=len(urls)) as span:
+            try:
+                results = get_web_fetcher().fetch_many_sync(urls)
+            except Exception as e:
+                return [f"Error extracting content: {str(e)}"] * len(urls)
+            span.set(
+                bytes_fetched=sum(result.get("bytes", 0) for result in results),
+                cache_hits=sum(1 for result in results if result["from_cache"])
+            )
+        
+        # Syndicated and mirrored pages are only read (and stored) once per session
+        dedup = get_dedup_index()
+        duplicates = {}
+        if dedup is not None:
+            for result in results:
+                if not result["error"]:
+                    duplicate_of = dedup.check(result["text"], key=result["url"], namespace="web")
+                    if duplicate_of is not None:
+                        duplicates[result["url"]] = duplicate_of
+        
+        # Keep the full pages for later sessions, not just the excerpt returned here
+        if self.knowledge_base is not None:
+            try:
+                self.knowledge_base.add_sources([
+                    result for result in results if not result["error"] and result["url"] not in duplicates
+                ])
+            except Exception as e:
+                print(f"Error adding sources to the knowledge base: {str(e)}")
+        
+        contents = []
+        for result in results:
+            if result["error"]:
+                contents.append(f"Error extracting content: {result['error']}")
+            elif result["url"] in duplicates:
+                contents.append(f"Skipped: near-duplicate of {duplicates[result['url']]}, which was already extracted.")
+            else:
+                contents.append(result["text"][:self.max_length])
+        return contents
+
+    def _ingest_many(self, urls):
+        """Index the full pages in chunks and return an excerpt of each"""
+        pipeline = IngestionPipeline(self.research_index, knowledge_base=self.knowledge_base)
         try:
-            loader = WebBaseLoader(url)
-            docs = loader.load()
-            content = docs[0].page_content
-            return content[:self.max_length]
+            results = pipeline.ingest(urls, metadata={"topic": self.topic} if self.topic else None,
+                                      excerpt_length=self.max_length, scope=self.topic)
         except Exception as e:
-            return f"Error extracting content: {str(e)}"
+            return [f"Error extracting content: {str(e)}"] * len(urls)
+        
+        by_url = {result["url"]: result for result in results}
+        contents = []
+        for url in urls:
+            result = by_url[url]
+            if result["error"]:
+                contents.append(f"Error extracting content: {result['error']}")
+            elif result["duplicate_of"]:
+                contents.append(f"Skipped: near-duplicate of {result['duplicate_of']}, which was already extracted.")
+            elif not result["chunks"]:
+                contents.append(f"{result['excerpt']}\n\n[The full page could not be indexed; source_search won't find it.]")
+            else:
+                contents.append(
+                    f"{result['excerpt']}\n\n[Full page indexed in {result['chunks']} chunks; "
+                    "use source_search to find the passages relevant to a question.]"
+                )
+        return contents
 
 # PDF extraction tool
-def extract_content_from_pdf(pdf_path):
+def _read_pdf_excerpt(page_texts, max_length):
+    """Read pages until `max_length` characters are collected, returning the text and the last page read
+
+    The last page is None when every page was read.
+    """
+    parts, length, last_page = [], 0, None
+    for number, text in page_texts:
+        if length >= max_length:
+            return "\n".join(parts)[:max_length], last_page
+        parts.append(text)
+        length += len(text) + 1
+        last_page = number
+    return "\n".join(parts)[:max_length], None
+
+
+def extract_content_from_pdf(pdf_path, pages=None, max_length=2000, research_index=None, topic=None):
     try:
         if not os.path.exists(pdf_path):
             return f"Error: File not found at {pdf_path}"
+        
+        if research_index is None:
+            # Pages are parsed lazily, so reading stops once the excerpt is full
+            text, last_page = _read_pdf_excerpt(iter_pdf_pages(pdf_path, pages), max_length)
+        else:
+            # Every page is indexed for source_search as it is parsed; only the excerpt is kept
+            read = []
             
-        loader = PyPDFLoader(pdf_path)
-        docs = loader.load()
-        return "\n".join([doc.page_content for doc in docs])
+            def page_documents():
+                for document in pdf_page_documents(pdf_path, pages, scope=topic, metadata={
+                    "type": "source_chunk", "url": os.path.abspath(pdf_path), **({"topic": topic} if topic else {})
+                }):
+                    read.append((document["metadata"]["page"], document["content"]))
+                    yield document
+            
+            indexed = research_index.add_documents(page_documents())
+            text, _ = _read_pdf_excerpt(read, max_length)
+        
+        # Mirrored copies of a PDF are only read once per session, but reading
+        # the same file again (e.g. in full after a page range) is not a duplicate
+        dedup = get_dedup_index()
+        path = os.path.abspath(pdf_path)
+        duplicate_of = dedup.check(text, key=f"{path}#{pages or 'all'}", namespace="pdf") if dedup is not None else None
+        if duplicate_of is not None and duplicate_of.rsplit("#", 1)[0] != path:
+            return f"Skipped: near-duplicate of {duplicate_of.rsplit('#', 1)[0]}, which was already extracted."
+        
+        if research_index is not None:
+            return (
+                f"{text}\n\n[{len(read)} pages indexed, {len(indexed)} of them new; "
+                "use source_search to find the passages relevant to a question.]"
+            )
+        if last_page is not None:
+            return f"{text}\n\n[Stopped after page {last_page}; pass pages starting at {last_page + 1} to read on.]"
+        return text
     except Exception as e:
         return f"Error extracting content from PDF: {str(e)}"
 
 class ExtractContentFromPDFTool(BaseTool):
     name: str = "pdf_extractor"
-    description: str = "Extract content from a PDF file. Input should be a file path."
+    description: str = (
+        "Extract content from a PDF file. Input should be a file path, and optionally "
+        "the pages to read as a 1-based range such as '1-5,9'."
+    )
+    max_length: int = 2000
+    # With an index, every page read is indexed for source_search, not just the excerpt returned
+    research_index: Any = None
+    topic: Optional[str] = None
 
-    def _run(self, pdf_path: str) -> str:
-        return extract_content_from_pdf(pdf_path)
+    @traced("tool")
+    def _run(self, pdf_path: str, pages: Optional[str] = None) -> str:
+        return extract_content_from_pdf(pdf_path, pages, max_length=self.max_length,
+                                        research_index=self.research_index, topic=self.topic)
 
 # Summarization tool
 def summarize_text(text, max_words=300):
@@ -59,20 +266,14 @@ def summarize_text(text, max_words=300):
         # Ensure text is not empty
         if not text or len(text.strip()) == 0:
             return "Error: Empty text provided for summarization."
-            
-        # Initialize LLM
-        llm = ChatOpenAI(temperature=0, model=DEFAULT_LLM_MODEL)
-        
-        # Limit text to avoid token issues
-        # This is a simple approach - a more sophisticated chunking strategy 
-        # might be better for very long texts
-        doc = Document(page_content=text[:25000])
         
-        # Use the stuff chain for summarization
-        chain = load_summarize_chain(llm, chain_type="stuff")
-        summary = chain.invoke([doc])
+        # Near-duplicates of an earlier input are summarized as that input, served from the cache
+        dedup = get_dedup_index()
+        if dedup is not None:
+            text = dedup.canonical(text, namespace="summary")
         
-        return summary["output_text"]
+        # Long texts are chunked and summarized in parallel instead of truncated
+        return map_reduce_summarize(text, max_words=max_words)
     except Exception as e:
         return f"Error during summarization: {str(e)}"
 
@@ -81,6 +282,7 @@ class SummarizationTool(BaseTool):
     name: str = "text_summarizer"
     description: str = "Summarize long text. Input should be text to summarize."
 
+    @traced("tool")
     def _run(self, text: str) -> str:
         return summarize_text(text)
 
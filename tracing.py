@@ -0,0 +1,255 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import contextvars
+import threading
+import itertools
+import json
+import time
+
+_current_tracer = ContextVar("current_tracer", default=None)
+_current_span = ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    def __init__(self, name, category, parent_id=None, attrs=None, start=None):
+        self.id = next(_span_ids)
+        self.name = name
+        self.category = category
+        self.parent_id = parent_id
+        self.attrs = dict(attrs or {})
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter() if start is None else start
+        self.end = None
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attrs):
+        """Attach attributes such as token counts or bytes fetched"""
+        self.attrs.update(attrs)
+
+    def add(self, **counters):
+        """Add to numeric attributes"""
+        for key, value in counters.items():
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+
+class Tracer:
+    """Collects nested timing spans for one research run
+
+    Spans nest through context variables, so work in other threads is
+    attributed to the right parent as long as the context is propagated
+    (see bind_context).
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name, category, start=None, parent=None, **attrs):
+        if parent is None:
+            parent = _current_span.get()
+        return Span(name, category, parent.id if parent else None, attrs, start)
+
+    def finish_span(self, span, end=None):
+        span.end = time.perf_counter() if end is None else end
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, category, **attrs):
+        """Time a block of code as a child of the current span"""
+        span = self.start_span(name, category, **attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set(error=str(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish_span(span)
+
+    def to_dicts(self):
+        """Spans as plain dicts, with times in seconds relative to the trace start"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return [
+            {
+                "id": span.id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "category": span.category,
+                "start": round(span.start - self.origin, 6),
+                "duration": round(span.duration, 6),
+                "thread": span.thread,
+                **({"attrs": span.attrs} if span.attrs else {}),
+            }
+            for span in spans
+        ]
+
+    def summary(self):
+        """Aggregate spans by category and name
+
+        Self time excludes time spent in child spans, which is what points
+        at the hot path.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        child_time = {}
+        for span in spans:
+            if span.parent_id is not None:
+                child_time[span.parent_id] = child_time.get(span.parent_id, 0.0) + span.duration
+
+        rows = {}
+        for span in spans:
+            row = rows.setdefault((span.category, span.name), {
+                "category": span.category, "name": span.name, "count": 0,
+                "total_time": 0.0, "self_time": 0.0,
+            })
+            row["count"] += 1
+            row["total_time"] += span.duration
+            row["self_time"] += max(span.duration - child_time.get(span.id, 0.0), 0.0)
+            for key, value in span.attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    row[key] = row.get(key, 0) + value
+        return sorted(rows.values(), key=lambda row: row["self_time"], reverse=True)
+
+    def print_summary(self, limit=15):
+        """Print a hot-path breakdown of where the run spent its time"""
+        rows = self.summary()
+        wall = time.perf_counter() - self.origin
+        print(f"\n{'='*50}")
+        print(" HOT PATH BREAKDOWN (by self time)")
+        print(f"{'='*50}")
+        print(f"{'category':<10} {'name':<32} {'count':>6} {'self s':>9} {'total s':>9} {'%wall':>6}")
+        for row in rows[:limit]:
+            print(f"{row['category']:<10} {row['name'][:32]:<32} {row['count']:>6} "
+                  f"{row['self_time']:>9.2f} {row['total_time']:>9.2f} {100 * row['self_time'] / wall:>5.1f}%")
+        tokens = sum(row.get("total_tokens", 0) for row in rows)
+        fetched = sum(row.get("bytes_fetched", 0) for row in rows)
+        print(f"\nTotal tokens: {tokens}  Bytes fetched: {fetched}  Wall time: {wall:.2f}s")
+
+    def export(self, path):
+        """Write the trace as Chrome trace JSON (.json) or one span per line (.jsonl)"""
+        spans = self.to_dicts()
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for span in spans:
+                    f.write(json.dumps(span) + "\n")
+            else:
+                json.dump({"traceEvents": [
+                    {
+                        "name": span["name"],
+                        "cat": span["category"],
+                        "ph": "X",
+                        "ts": span["start"] * 1e6,
+                        "dur": span["duration"] * 1e6,
+                        "pid": 1,
+                        "tid": span["thread"],
+                        "args": span.get("attrs", {}),
+                    }
+                    for span in spans
+                ]}, f)
+
+
+@contextmanager
+def use_tracer(tracer):
+    """Make `tracer` the active tracer for the current context"""
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+
+def get_tracer():
+    return _current_tracer.get()
+
+
+@contextmanager
+def trace_span(name, category, **attrs):
+    """Time a block under the active tracer; a no-op when tracing is off"""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield Span(name, category, attrs=attrs)
+        return
+    with tracer.span(name, category, **attrs) as span:
+        yield span
+
+
+def traced(category, name=None):
+    """Decorator that wraps a function (or a tool's _run) in a span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # Tools are named after their `name` field; plain functions after themselves
+            owner_name = getattr(args[0], "name", None) if args else None
+            span_name = name or (owner_name if isinstance(owner_name, str) else fn.__qualname__)
+            with trace_span(span_name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind_context(fn):
+    """Wrap fn so each call runs in a copy of the caller's context
+
+    Use when handing work to a thread pool so spans started there nest
+    under the span that submitted them.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+class CrewTraceCallbacks:
+    """Crew step and task callbacks that turn agent progress into spans
+
+    CrewAI only reports steps and tasks once they finish, so each span runs
+    from the previous event (or the start of the crew) to the current one.
+    Tasks run one after another in a sequential crew, which keeps these
+    spans accurate.
+    """
+
+    def __init__(self):
+        self._task_start = None
+        self._step_start = None
+        self._parent = None
+
+    def start(self):
+        """Mark the start of the crew run; call inside the crew's span"""
+        self._parent = _current_span.get()
+        self._task_start = self._step_start = time.perf_counter()
+
+    def on_step(self, step_output):
+        tracer = _current_tracer.get()
+        if tracer is None or self._step_start is None:
+            return
+        now = time.perf_counter()
+        tool = getattr(step_output, "tool", None)
+        span = tracer.start_span(f"step: {tool}" if tool else "step", "agent",
+                                 start=self._step_start, parent=self._parent)
+        tracer.finish_span(span, end=now)
+        self._step_start = now
+
+    def on_task(self, task_output):
+        tracer = _current_tracer.get()
+        if tracer is None or self._task_start is None:
+            return
+        now = time.perf_counter()
+        name = getattr(task_output, "name", None) or getattr(task_output, "agent", None) or "task"
+        span = tracer.start_span(str(name), "task", start=self._task_start, parent=self._parent,
+                                 output_chars=len(str(getattr(task_output, "raw", task_output))))
+        tracer.finish_span(span, end=now)
+        self._task_start = self._step_start = now
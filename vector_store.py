@@ -0,0 +1,420 @@
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore, VectorStoreQueryResult,
+    MetadataFilters, FilterOperator, FilterCondition
+)
+from llama_index.core.vector_stores.utils import node_to_metadata_dict, metadata_dict_to_node
+from pydantic import PrivateAttr
+from config import FAISS_INDEX_TYPE, FAISS_NLIST, FAISS_NPROBE, FAISS_HNSW_M, FAISS_HNSW_EF_SEARCH, FAISS_SNAPSHOT_INTERVAL
+import numpy as np
+import threading
+import sqlite3
+import faiss
+import json
+import os
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+# FAISS warns when an IVF index is trained on fewer points than this per list
+IVF_MIN_POINTS_PER_LIST = 39
+IVF_MAX_TRAINING_POINTS_PER_LIST = 256
+
+
+def _matches(metadata, filters):
+    """Evaluate LlamaIndex metadata filters against a stored metadata dict"""
+    results = []
+    for f in filters.filters:
+        if isinstance(f, MetadataFilters):
+            results.append(_matches(metadata, f))
+            continue
+        value = metadata.get(f.key)
+        try:
+            if f.operator == FilterOperator.EQ:
+                results.append(value == f.value)
+            elif f.operator == FilterOperator.NE:
+                results.append(value != f.value)
+            elif f.operator == FilterOperator.IN:
+                results.append(value in f.value)
+            elif f.operator == FilterOperator.NIN:
+                results.append(value not in f.value)
+            elif f.operator == FilterOperator.GT:
+                results.append(value is not None and value > f.value)
+            elif f.operator == FilterOperator.GTE:
+                results.append(value is not None and value >= f.value)
+            elif f.operator == FilterOperator.LT:
+                results.append(value is not None and value < f.value)
+            elif f.operator == FilterOperator.LTE:
+                results.append(value is not None and value <= f.value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {f.operator}")
+        except TypeError:
+            results.append(False)
+    if filters.condition == FilterCondition.OR:
+        return any(results)
+    return all(results)
+
+
+class FaissVectorStore(BasePydanticVectorStore):
+    """In-process FAISS vector store with memory-mapped persistence
+
+    Every vector gets a sequential int64 ID that is at once its FAISS ID, its
+    row in a memory-mapped float32 file (`vectors.f32`) and its row in a
+    SQLite id map (`nodes.sqlite`) holding the node's text, metadata and the
+    ID of its document in the index's metadata log. Vectors and rows are
+    written on every add; the FAISS index itself is snapshotted to
+    `index.faiss` every `snapshot_interval` vectors and on save(). Reopening
+    loads the snapshot and replays only the vectors added after it.
+
+    Index types:
+        flat: exact inner-product search
+        ivf: exact search until there are enough vectors to train `nlist`
+            inverted lists, then IVF search probing `nprobe` lists. IVF
+            snapshots are memory-mapped on open, so startup doesn't read them.
+        hnsw: HNSW graph search with `hnsw_m` links per node
+
+    Flat and HNSW snapshots are read on the first query or add rather than
+    when the store is opened. Vectors are L2-normalized, so scores are
+    cosine similarities.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+
+    persist_dir: str
+    index_type: str = FAISS_INDEX_TYPE
+    nlist: int = FAISS_NLIST
+    nprobe: int = FAISS_NPROBE
+    hnsw_m: int = FAISS_HNSW_M
+    ef_search: int = FAISS_HNSW_EF_SEARCH
+    snapshot_interval: int = FAISS_SNAPSHOT_INTERVAL
+
+    _lock: threading.RLock = PrivateAttr()
+    _db: sqlite3.Connection = PrivateAttr()
+    _index: object = PrivateAttr(default=None)
+    _layout: object = PrivateAttr(default=None)
+    _read_only: bool = PrivateAttr(default=False)
+    _dim: object = PrivateAttr(default=None)
+    _rows: int = PrivateAttr(default=0)
+    _indexed_rows: int = PrivateAttr(default=0)
+    _matrix: object = PrivateAttr(default=None)
+    _capacity: int = PrivateAttr(default=0)
+
+    def __init__(self, persist_dir, **kwargs):
+        super().__init__(persist_dir=persist_dir, **kwargs)
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type {self.index_type!r}, expected one of {INDEX_TYPES}")
+        os.makedirs(persist_dir, exist_ok=True)
+        self._lock = threading.RLock()
+
+        self._db = sqlite3.connect(os.path.join(persist_dir, "nodes.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            "id INTEGER PRIMARY KEY, node_id TEXT NOT NULL, ref_doc_id TEXT, doc_id TEXT, "
+            "text TEXT, metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS nodes_node_id ON nodes(node_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS nodes_ref_doc_id ON nodes(ref_doc_id)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        if meta.get("index_type", self.index_type) != self.index_type:
+            raise ValueError(
+                f"{persist_dir} holds a {meta['index_type']!r} FAISS index, not {self.index_type!r}"
+            )
+        self._dim = int(meta["dim"]) if "dim" in meta else None
+        self._layout = meta.get("layout")
+        (max_id,) = self._db.execute("SELECT MAX(id) FROM nodes").fetchone()
+        self._rows = 0 if max_id is None else max_id + 1
+        if self._dim:
+            self._open_matrix()
+
+        # IVF inverted lists can be memory-mapped, which makes opening them instant
+        if self._layout == "ivf" and os.path.exists(self._index_path):
+            self._load_index(mmap=True)
+
+    @classmethod
+    def class_name(cls):
+        return "FaissVectorStore"
+
+    @property
+    def client(self):
+        return self._index
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.persist_dir, "index.faiss")
+
+    @property
+    def _matrix_path(self):
+        return os.path.join(self.persist_dir, "vectors.f32")
+
+    def _set_meta(self, **values):
+        self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                             [(name, str(value)) for name, value in values.items()])
+
+    def _open_matrix(self):
+        size = os.path.getsize(self._matrix_path) if os.path.exists(self._matrix_path) else 0
+        self._capacity = size // (self._dim * 4)
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+",
+                                 shape=(self._capacity, self._dim)) if self._capacity else None
+
+    def _grow(self, needed):
+        """Extend the vector file to hold at least `needed` rows"""
+        new_capacity = max(self._capacity * 2, needed, 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(new_capacity * self._dim * 4)
+        self._capacity = new_capacity
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+",
+                                 shape=(self._capacity, self._dim))
+
+    def _new_index(self, layout):
+        if layout == "hnsw":
+            return faiss.IndexIDMap2(faiss.IndexHNSWFlat(self._dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT))
+        if layout == "ivf":
+            quantizer = faiss.IndexFlatIP(self._dim)
+            return faiss.IndexIVFFlat(quantizer, self._dim, self.nlist, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self._dim))
+
+    def _configure(self, index):
+        """Apply search-time parameters, which aren't stored in snapshots"""
+        if self._layout == "ivf":
+            faiss.extract_index_ivf(index).nprobe = self.nprobe
+        elif self._layout == "hnsw":
+            faiss.downcast_index(index.index).hnsw.efSearch = self.ef_search
+        return index
+
+    def _load_index(self, mmap=False):
+        """Load the latest snapshot and add the vectors written since it was taken"""
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        if os.path.exists(self._index_path) and "snapshot_rows" in meta:
+            self._index = self._configure(faiss.read_index(self._index_path, flags))
+            self._indexed_rows = int(meta["snapshot_rows"])
+        else:
+            # Without a snapshot an IVF index has to be retrained from the stored vectors
+            if self._layout == "ivf":
+                self._layout = "flat"
+                self._set_meta(layout=self._layout)
+                self._db.commit()
+            self._index = self._new_index(self._layout)
+            self._indexed_rows = 0
+        self._read_only = bool(mmap)
+
+        if self._indexed_rows < self._rows:
+            self._ensure_writable()
+            self._add_rows(self._indexed_rows, self._rows)
+
+    def _ensure_index(self):
+        if self._index is None and self._dim is not None:
+            self._load_index()
+        return self._index
+
+    def _ensure_writable(self):
+        """Swap a memory-mapped (read-only) index for an in-memory copy before writing to it"""
+        if self._read_only:
+            self._index = self._configure(faiss.read_index(self._index_path))
+            self._read_only = False
+
+    def _add_rows(self, start, end):
+        """Add stored vectors with IDs in [start, end) to the FAISS index"""
+        for batch_start in range(start, end, 65536):
+            batch_end = min(batch_start + 65536, end)
+            ids = np.array([
+                row for (row,) in self._db.execute(
+                    "SELECT id FROM nodes WHERE id >= ? AND id < ? AND deleted = 0 ORDER BY id",
+                    (batch_start, batch_end)
+                )
+            ], dtype=np.int64)
+            if len(ids):
+                self._index.add_with_ids(np.ascontiguousarray(self._matrix[ids]), ids)
+        self._indexed_rows = end
+
+    def _maybe_train_ivf(self):
+        """Replace the exact warm-up index with a trained IVF index once there is enough data"""
+        if self.index_type != "ivf" or self._layout == "ivf":
+            return
+        if self.count() < self.nlist * IVF_MIN_POINTS_PER_LIST:
+            return
+
+        live = np.array([row for (row,) in self._db.execute("SELECT id FROM nodes WHERE deleted = 0")],
+                        dtype=np.int64)
+        sample_size = min(len(live), self.nlist * IVF_MAX_TRAINING_POINTS_PER_LIST)
+        sample = np.sort(np.random.default_rng(0).choice(live, sample_size, replace=False))
+        self._layout = "ivf"
+        index = self._new_index("ivf")
+        index.train(np.ascontiguousarray(self._matrix[sample]))
+        self._index = self._configure(index)
+        self._add_rows(0, self._rows)
+        # The layout switch is only recorded together with the first IVF snapshot
+        self._write_snapshot(layout="ivf")
+
+    def add(self, nodes, **add_kwargs):
+        """Add nodes with embeddings, returning their node IDs"""
+        if not nodes:
+            return []
+        vectors = np.array([node.get_embedding() for node in nodes], dtype=np.float32)
+        faiss.normalize_L2(vectors)
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._layout = "hnsw" if self.index_type == "hnsw" else "flat"
+                self._set_meta(dim=self._dim, index_type=self.index_type, layout=self._layout)
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-dimensional embeddings, got {vectors.shape[1]}")
+
+            self._ensure_index()
+            self._ensure_writable()
+
+            start = self._rows
+            ids = np.arange(start, start + len(nodes), dtype=np.int64)
+            if self._capacity < start + len(nodes):
+                self._grow(start + len(nodes))
+            self._matrix[start:start + len(nodes)] = vectors
+            self._matrix.flush()
+
+            self._db.executemany(
+                "INSERT INTO nodes (id, node_id, ref_doc_id, doc_id, text, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        int(row), node.node_id, node.ref_doc_id, node.metadata.get("id"),
+                        node.get_content(),
+                        json.dumps(node_to_metadata_dict(node, remove_text=True, flat_metadata=False))
+                    )
+                    for row, node in zip(ids, nodes)
+                ]
+            )
+            self._db.commit()
+            self._rows = start + len(nodes)
+
+            self._index.add_with_ids(vectors, ids)
+            self._indexed_rows = self._rows
+            self._maybe_train_ivf()
+
+            (snapshot_rows,) = self._db.execute(
+                "SELECT value FROM meta WHERE name = 'snapshot_rows'"
+            ).fetchone() or (0,)
+            if self._rows - int(snapshot_rows) >= self.snapshot_interval:
+                self.save()
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id, **delete_kwargs):
+        """Delete every node of a document"""
+        with self._lock:
+            ids = np.array([
+                row for (row,) in self._db.execute(
+                    "SELECT id FROM nodes WHERE ref_doc_id = ? AND deleted = 0", (ref_doc_id,)
+                )
+            ], dtype=np.int64)
+            if not len(ids):
+                return
+            self._db.execute("UPDATE nodes SET deleted = 1 WHERE ref_doc_id = ?", (ref_doc_id,))
+            self._db.commit()
+
+            # HNSW can't remove vectors; deleted rows are skipped at query time instead
+            if self._index is not None and self._layout != "hnsw":
+                self._ensure_writable()
+                self._index.remove_ids(ids)
+
+    def _fetch_rows(self, ids):
+        rows = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.update((row[0], row) for row in self._db.execute(
+                f"SELECT id, node_id, ref_doc_id, text, metadata FROM nodes "
+                f"WHERE id IN ({placeholders}) AND deleted = 0", chunk
+            ))
+        return rows
+
+    def query(self, query, **kwargs):
+        """Return the nodes nearest to the query embedding that pass its filters"""
+        if query.query_embedding is None:
+            raise ValueError("FaissVectorStore only supports queries with an embedding")
+
+        with self._lock:
+            index = self._ensure_index()
+            if index is None or index.ntotal == 0:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+            vector = np.array([query.query_embedding], dtype=np.float32)
+            faiss.normalize_L2(vector)
+            top_k = query.similarity_top_k
+            doc_ids = set(query.doc_ids or [])
+            node_ids = set(query.node_ids or [])
+            filtered = bool(query.filters or doc_ids or node_ids)
+
+            # Filters and deleted rows are applied to the candidates, so widen
+            # the search until enough of them survive or the index is exhausted
+            fetch_k = top_k * 4 if filtered else top_k
+            while True:
+                fetch_k = min(fetch_k, index.ntotal)
+                scores, ids = index.search(vector, fetch_k)
+                candidates = [(int(row), float(score)) for row, score in zip(ids[0], scores[0]) if row >= 0]
+                rows = self._fetch_rows([row for row, _ in candidates]) if candidates else {}
+
+                nodes, similarities, result_ids = [], [], []
+                for row, score in candidates:
+                    record = rows.get(row)
+                    if record is None:
+                        continue
+                    _, node_id, ref_doc_id, text, metadata_json = record
+                    metadata = json.loads(metadata_json)
+                    if node_ids and node_id not in node_ids:
+                        continue
+                    if doc_ids and ref_doc_id not in doc_ids:
+                        continue
+                    if query.filters and not _matches(metadata, query.filters):
+                        continue
+                    node = metadata_dict_to_node(metadata)
+                    node.set_content(text or "")
+                    nodes.append(node)
+                    similarities.append(score)
+                    result_ids.append(node_id)
+                    if len(nodes) == top_k:
+                        break
+
+                if len(nodes) >= top_k or fetch_k >= index.ntotal:
+                    return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=result_ids)
+                fetch_k *= 4
+
+    def count(self):
+        """Number of live (not deleted) nodes"""
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM nodes WHERE deleted = 0").fetchone()
+            return count
+
+    def doc_ids(self):
+        """Map the ID of each document with live nodes in the store to its metadata log ID"""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT DISTINCT ref_doc_id, doc_id FROM nodes WHERE deleted = 0 AND ref_doc_id IS NOT NULL"
+            ))
+
+    def save(self):
+        """Snapshot the FAISS index so the next open doesn't replay vectors
+
+        The snapshot is written to a temporary file and atomically swapped in.
+        """
+        with self._lock:
+            if self._index is None or self._read_only:
+                return
+            self._write_snapshot()
+
+    def _write_snapshot(self, **meta):
+        tmp_path = self._index_path + ".tmp"
+        faiss.write_index(self._index, tmp_path)
+        os.replace(tmp_path, self._index_path)
+        self._set_meta(snapshot_rows=self._indexed_rows, **meta)
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self.save()
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._db.close()
@@ -0,0 +1,193 @@
+from urllib.parse import urlsplit
+from bs4 import BeautifulSoup
+from cache import DiskCache
+from config import (
+    WEB_CACHE_DIR, WEB_CACHE_TTL, WEB_MAX_CONNECTIONS,
+    WEB_PER_HOST_LIMIT, WEB_TIMEOUT
+)
+import threading
+import asyncio
+import httpx
+import time
+
+USER_AGENT = "Mozilla/5.0 (compatible; ResearchGPT/1.0)"
+
+
+NON_CONTENT_TAGS = ["script", "style", "noscript", "iframe", "svg", "form", "button"]
+# Site chrome; kept when it sits inside the main content (e.g. an article's own header)
+BOILERPLATE_TAGS = ["nav", "header", "footer", "aside"]
+
+
+def html_to_text(html):
+    """Extract the main visible text from an HTML page, without navigation and other boilerplate"""
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(NON_CONTENT_TAGS):
+        tag.decompose()
+    for tag in soup(BOILERPLATE_TAGS):
+        if not tag.decomposed and tag.find_parent(["main", "article"]) is None:
+            tag.decompose()
+    
+    # Prefer the page's main content when it is marked up as such
+    articles = soup.find_all("article")
+    content = soup.find("main") or (articles[0] if len(articles) == 1 else soup)
+    return content.get_text(separator="\n", strip=True)
+
+
+class _BackgroundLoop:
+    """An event loop running in a daemon thread
+
+    Tools are called synchronously (sometimes from inside another event loop),
+    so async work is submitted to this loop instead of calling asyncio.run.
+    Keeping one loop alive also lets the HTTP connection pool outlive a call.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="researchgpt-io", daemon=True)
+        self.thread.start()
+
+    def run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def run_async(coro, timeout=None):
+    """Run a coroutine on the shared background loop and wait for its result"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = _BackgroundLoop()
+    return _background_loop.run(coro, timeout)
+
+
+class WebFetcher:
+    """Concurrent page fetcher with a pooled HTTP client and a disk-backed cache
+
+    Responses are cached by URL. Within `cache_ttl` a cached page is returned
+    without touching the network; after that the page is revalidated with
+    If-None-Match / If-Modified-Since, so unchanged pages cost a 304 instead of
+    a full download. At most `per_host_limit` requests run against one host
+    at a time.
+
+    The HTTP client and per-host semaphores belong to the loop that first
+    uses them, so synchronous callers should go through fetch_many_sync.
+    """
+
+    def __init__(self, cache_dir=WEB_CACHE_DIR, cache_ttl=WEB_CACHE_TTL,
+                 max_connections=WEB_MAX_CONNECTIONS, per_host_limit=WEB_PER_HOST_LIMIT,
+                 timeout=WEB_TIMEOUT, transport=None):
+        """Initialize the fetcher
+
+        Args:
+            cache_dir: Directory for cached responses. If None, responses aren't cached.
+            cache_ttl: Seconds a cached page is served without revalidation
+            max_connections: Size of the shared connection pool
+            per_host_limit: Maximum concurrent requests to a single host
+            timeout: Per-request timeout in seconds
+            transport: Optional httpx transport, e.g. to route requests to a local test server
+        """
+        self.cache = DiskCache(cache_dir) if cache_dir else None
+        self.cache_ttl = cache_ttl
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.transport = transport
+        self.bytes_fetched = 0
+        self._client = None
+        self._host_limits = {}
+
+    def _get_client(self):
+        # Created lazily so it binds to the loop the fetcher runs on
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                transport=self.transport
+            )
+        return self._client
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def fetch(self, url):
+        """Fetch a single URL
+
+        Returns:
+            A dict with "url", "status", "text", "from_cache", "error" and "bytes"
+            (bytes downloaded) keys
+        """
+        cached = self.cache.get_entry(url) if self.cache else None
+        if cached and time.time() - cached["stored_at"] <= self.cache_ttl:
+            return {**cached["value"], "from_cache": True, "error": None, "bytes": 0}
+
+        headers = {}
+        if cached:
+            if cached["value"].get("etag"):
+                headers["If-None-Match"] = cached["value"]["etag"]
+            if cached["value"].get("last_modified"):
+                headers["If-Modified-Since"] = cached["value"]["last_modified"]
+
+        try:
+            async with self._host_limit(url):
+                response = await self._get_client().get(url, headers=headers)
+        except Exception as e:
+            return {"url": url, "status": None, "text": "", "from_cache": False, "error": str(e), "bytes": 0}
+
+        size = len(response.content)
+        self.bytes_fetched += size
+
+        if response.status_code == 304 and cached:
+            # Unchanged: restart the TTL clock on the cached copy
+            self.cache.set(url, cached["value"])
+            return {**cached["value"], "from_cache": True, "error": None, "bytes": size}
+
+        if response.status_code >= 400:
+            return {
+                "url": url, "status": response.status_code, "text": "",
+                "from_cache": False, "error": f"HTTP {response.status_code}", "bytes": size
+            }
+
+        content_type = response.headers.get("content-type", "")
+        text = html_to_text(response.text) if "html" in content_type or not content_type else response.text
+        result = {
+            "url": url,
+            "status": response.status_code,
+            "text": text,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+        }
+        if self.cache and "no-store" not in response.headers.get("cache-control", ""):
+            self.cache.set(url, result)
+        return {**result, "from_cache": False, "error": None, "bytes": size}
+
+    async def fetch_many(self, urls):
+        """Fetch several URLs concurrently, returning results in input order"""
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
+
+    def fetch_many_sync(self, urls):
+        """Blocking wrapper around fetch_many for synchronous callers"""
+        return run_async(self.fetch_many(urls))
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_web_fetcher():
+    """Get the process-wide web fetcher, shared by all extraction tools"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = WebFetcher()
+        return _fetcher